@@ -0,0 +1,7 @@
+"""DropBot question answering helpers used by the Streamlit app."""
+from .cascade import Cascade, MatchResult
+from .matcher import MatcherIndex
+from .normalize import normalize_text
+from .semantic import SemanticIndex
+
+__all__ = ["Cascade", "MatchResult", "MatcherIndex", "SemanticIndex", "normalize_text"]
@@ -0,0 +1,216 @@
+"""Inverted-file (IVF) approximate nearest-neighbour index for DropBot embeddings.
+
+Vectors are partitioned by spherical k-means into ``nlist`` cells; a query is
+scored against the centroids and then only against the vectors of its
+``nprobe`` closest cells. ``nprobe`` is the recall/latency knob: 1 is fastest,
+``nlist`` degenerates to exact search. New vectors are appended to their
+cell in O(1) amortized, the centroids stay fixed until the next rebuild.
+
+Built with a ``matrix`` (:class:`~dropbot.semantic.EmbeddingMatrix` or
+:class:`~dropbot.quantize.QuantizedMatrix` holding the same rows), the cells
+keep only ids and the probed rows are scored by ``matrix.search_rows``, so a
+quantized matrix keeps its memory saving.
+
+Benchmark against exact search on synthetic clustered data::
+
+    python -m dropbot.ann --sizes 10000 100000 1000000 --dim 128
+"""
+import argparse
+import threading
+import time
+
+import numpy as np
+
+from .semantic import top_positions
+
+
+def _normalize_rows(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def spherical_kmeans(vectors, nlist, iterations=10, sample=None, seed=0):
+    """Unit-norm centroids of ``vectors`` (cosine k-means on a sample)."""
+    rng = np.random.default_rng(seed)
+    if sample and len(vectors) > sample:
+        vectors = vectors[np.sort(rng.choice(len(vectors), sample, replace=False))]
+    vectors = np.asarray(vectors, dtype=np.float32)
+    centroids = vectors[rng.choice(len(vectors), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assign = assign_cells(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, vectors)
+        empty = ~sums.any(axis=1)
+        # Une cellule vide reprend un point au hasard plutôt que de disparaître.
+        sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+        centroids = _normalize_rows(sums).astype(np.float32)
+    return centroids
+
+
+def assign_cells(vectors, centroids, chunk=65536):
+    """Index of the closest centroid for every row of ``vectors``."""
+    out = np.empty(len(vectors), dtype=np.intp)
+    for start in range(0, len(vectors), chunk):
+        out[start : start + chunk] = np.argmax(vectors[start : start + chunk] @ centroids.T, axis=1)
+    return out
+
+
+class _Cell:
+    """Growable vectors + ids of one inverted list (ids only when ``dim`` is ``None``)."""
+
+    __slots__ = ("vectors", "ids", "size")
+
+    def __init__(self, dim):
+        self.vectors = None if dim is None else np.empty((0, dim), dtype=np.float32)
+        self.ids = np.empty(0, dtype=np.int64)
+        self.size = 0
+
+    def extend(self, vectors, ids):
+        size = self.size + len(ids)
+        if size > len(self.ids):
+            capacity = max(8, size, 2 * len(self.ids))
+            grown_ids = np.empty(capacity, dtype=np.int64)
+            grown_ids[: self.size] = self.ids[: self.size]
+            if self.vectors is not None:
+                grown_vectors = np.empty((capacity, self.vectors.shape[1]), dtype=np.float32)
+                grown_vectors[: self.size] = self.vectors[: self.size]
+                self.vectors = grown_vectors
+            self.ids = grown_ids
+        if self.vectors is not None:
+            self.vectors[self.size : size] = vectors
+        self.ids[self.size : size] = ids
+        self.size = size
+
+
+class IVFIndex:
+    """Cosine IVF index over L2-normalized float32 vectors."""
+
+    def __init__(self, centroids, nprobe=8, matrix=None):
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.nprobe = nprobe
+        self.matrix = matrix
+        dim = None if matrix is not None else self.centroids.shape[1]
+        self._cells = [_Cell(dim) for _ in range(len(self.centroids))]
+        self._lock = threading.Lock()
+        self.size = 0
+
+    @classmethod
+    def build(cls, vectors, nlist=None, nprobe=8, seed=0, matrix=None, chunk=65536):
+        """Train the centroids on ``vectors`` and index them with ids ``0..n-1``.
+
+        ``vectors`` only needs ``len`` and indexing by slice or position
+        array (a memory-mapped array, an :class:`EmbeddingMatrix`…): it is
+        read chunk by chunk and never copied whole.
+        """
+        n = len(vectors)
+        nlist = nlist or max(1, min(n, int(np.sqrt(n))))
+        rng = np.random.default_rng(seed)
+        sample = 64 * nlist
+        positions = np.sort(rng.choice(n, sample, replace=False)) if n > sample else np.arange(n)
+        centroids = spherical_kmeans(np.asarray(vectors[positions], dtype=np.float32), nlist, seed=seed)
+        index = cls(centroids, nprobe=nprobe, matrix=matrix)
+        for start in range(0, n, chunk):
+            index.add(vectors[start : start + chunk])
+        return index
+
+    def __len__(self):
+        return self.size
+
+    def add(self, vectors, ids=None):
+        """Append ``vectors`` (ids default to the next positions)."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not len(vectors):
+            return
+        with self._lock:
+            if ids is None:
+                ids = np.arange(self.size, self.size + len(vectors), dtype=np.int64)
+            assign = assign_cells(vectors, self.centroids)
+            order = np.argsort(assign, kind="stable")
+            cells, starts = np.unique(assign[order], return_index=True)
+            bounds = list(starts[1:]) + [len(order)]
+            for cell, start, end in zip(cells, starts, bounds):
+                rows = order[start:end]
+                self._cells[cell].extend(vectors[rows], ids[rows])
+            self.size += len(vectors)
+
+    def search(self, query, k=5, nprobe=None):
+        """Return ``(ids, scores)`` of the ``k`` best vectors in the probed cells."""
+        nprobe = min(nprobe or self.nprobe, len(self._cells))
+        probes = top_positions(self.centroids @ query, nprobe)
+        ids, scores = [], []
+        for cell in (self._cells[c] for c in probes):
+            size = cell.size
+            if size:
+                ids.append(cell.ids[:size])
+                if self.matrix is None:
+                    scores.append(cell.vectors[:size] @ query)
+        if not ids:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        ids = np.concatenate(ids)
+        if self.matrix is not None:
+            return self.matrix.search_rows(ids, query, k)
+        scores = np.concatenate(scores)
+        best = top_positions(scores, k)
+        return ids[best], scores[best]
+
+
+# === Benchmark ===
+
+
+def synthetic_embeddings(n, dim, clusters=None, seed=0):
+    """Unit vectors drawn around random topics, like sentence embeddings."""
+    rng = np.random.default_rng(seed)
+    clusters = clusters or max(8, n // 200)
+    topics = _normalize_rows(rng.standard_normal((clusters, dim)).astype(np.float32))
+    out = np.empty((n, dim), dtype=np.float32)
+    for start in range(0, n, 65536):
+        end = min(n, start + 65536)
+        noise = rng.standard_normal((end - start, dim)).astype(np.float32) * 0.08
+        out[start:end] = topics[rng.integers(clusters, size=end - start)] + noise
+    return _normalize_rows(out).astype(np.float32)
+
+
+def _exact(vectors, query, k):
+    return top_positions(vectors @ query, k)
+
+
+def benchmark(n, dim, queries=200, k=10, probes=(1, 4, 16, 64), seed=0):
+    vectors = synthetic_embeddings(n, dim, seed=seed)
+    rng = np.random.default_rng(seed + 1)
+    picks = rng.choice(n, queries, replace=False)
+    noise = rng.standard_normal((queries, dim)).astype(np.float32) * 0.05
+    query_vectors = _normalize_rows(vectors[picks] + noise).astype(np.float32)
+
+    start = time.perf_counter()
+    truth = [set(_exact(vectors, q, k).tolist()) for q in query_vectors]
+    exact_ms = (time.perf_counter() - start) * 1000 / queries
+
+    start = time.perf_counter()
+    index = IVFIndex.build(vectors, seed=seed)
+    build_s = time.perf_counter() - start
+    print(f"n={n:>9,} dim={dim} nlist={len(index.centroids)} build {build_s:.1f} s  exact {exact_ms:.3f} ms/query")
+    for nprobe in probes:
+        if nprobe > len(index.centroids):
+            break
+        start = time.perf_counter()
+        found = [index.search(q, k, nprobe)[0] for q in query_vectors]
+        ann_ms = (time.perf_counter() - start) * 1000 / queries
+        recall = np.mean([len(truth[i] & set(ids.tolist())) / k for i, ids in enumerate(found)])
+        print(f"    nprobe={nprobe:<3} recall@{k} {recall:6.1%}  {ann_ms:.3f} ms/query  ({exact_ms / ann_ms:.1f}x)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="IVF vs exact search on synthetic embeddings")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--dim", type=int, default=128)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--probes", type=int, nargs="+", default=[1, 4, 16, 64])
+    args = parser.parse_args(argv)
+    for n in args.sizes:
+        benchmark(n, args.dim, queries=args.queries, k=args.k, probes=args.probes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Offset-indexed answer store for DropBot.
+
+Matching only needs the keys, so the answers live in a separate blob:
+``answers.bin`` is the UTF-8 answers laid end to end and ``answers.json`` the
+keys with the byte offset where each answer starts. Only the keys and
+offsets are held in memory; an answer is sliced out of the memory-mapped blob
+when it is actually shown, so resident memory grows with the keys, not with
+the answer bodies.
+"""
+import json
+import mmap
+from collections.abc import Mapping
+
+import numpy as np
+
+from .fileio import atomic_write
+
+
+def write_answers(qa_pairs, index_path, blob_path):
+    """Write ``qa_pairs`` as an offsets index plus an answer blob."""
+    keys = list(qa_pairs)
+    offsets = [0]
+
+    def write_blob(f):
+        for key in keys:
+            data = qa_pairs[key].encode("utf-8")
+            f.write(data)
+            offsets.append(offsets[-1] + len(data))
+
+    atomic_write(blob_path, write_blob)
+    # L'index est écrit après le blob : il ne référence jamais d'octets absents.
+    atomic_write(index_path, lambda f: json.dump({"keys": keys, "offsets": offsets}, f, ensure_ascii=False), mode="w")
+
+
+class AnswerStore(Mapping):
+    """Read-only ``{question: answer}`` mapping backed by a memory-mapped blob."""
+
+    def __init__(self, index_path, blob_path):
+        with open(index_path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+        self._positions = {key: pos for pos, key in enumerate(index["keys"])}
+        self._offsets = np.asarray(index["offsets"], dtype=np.int64)
+        with open(blob_path, "rb") as f:
+            size = f.seek(0, 2)
+            if size != self._offsets[-1]:
+                raise ValueError(f"{blob_path} does not match {index_path}")
+            # mmap refuse les fichiers vides
+            self._blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def __getitem__(self, key):
+        pos = self._positions[key]
+        return self._blob[self._offsets[pos] : self._offsets[pos + 1]].decode("utf-8")
+
+    def __contains__(self, key):
+        return key in self._positions
+
+    def __iter__(self):
+        return iter(self._positions)
+
+    def __len__(self):
+        return len(self._positions)
+
+    def close(self):
+        if isinstance(self._blob, mmap.mmap):
+            self._blob.close()
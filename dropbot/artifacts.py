@@ -0,0 +1,89 @@
+"""On-disk embedding artifact stored next to ``qa_data.json``.
+
+``qa_data.embeddings.npy`` holds the float32 key matrix and
+``qa_data.embeddings.json`` its manifest (source hash, model, key order). The
+matrix is opened with ``mmap_mode='r'`` so every Streamlit worker shares the
+same page-cached copy; it is rebuilt only when the JSON content changes.
+"""
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from .fileio import atomic_write, file_lock
+from .semantic import encode
+
+
+def content_hash(*paths):
+    """SHA-256 over the files at ``paths`` (missing files hash as absent)."""
+    digest = hashlib.sha256()
+    for path in paths:
+        if not os.path.exists(path):
+            digest.update(b"\0absent\0")
+            continue
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 16), b""):
+                digest.update(chunk)
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def artifact_paths(json_path):
+    """Return the ``(matrix, manifest)`` paths that belong to ``json_path``."""
+    base = os.path.splitext(json_path)[0]
+    return base + ".embeddings.npy", base + ".embeddings.json"
+
+
+def read_manifest(json_path):
+    """Return the manifest dict, or ``None`` when missing or unreadable."""
+    _, manifest_path = artifact_paths(json_path)
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_embeddings(json_path, keys, embeddings, model_name, source_hash):
+    """Write the matrix and then its manifest (the manifest commits the pair)."""
+    matrix_path, manifest_path = artifact_paths(json_path)
+    manifest = {
+        "source_hash": source_hash,
+        "model": model_name,
+        "dim": int(embeddings.shape[1]),
+        "keys": list(keys),
+    }
+    with file_lock(matrix_path):
+        atomic_write(matrix_path, lambda f: np.save(f, embeddings))
+        atomic_write(manifest_path, lambda f: json.dump(manifest, f, ensure_ascii=False), mode="w")
+
+
+def load_or_build_embeddings(json_path, keys, model, model_name):
+    """Memory-map the artifact for ``json_path``, rebuilding it if stale.
+
+    ``keys`` are the keys of ``json_path`` itself: keys learned since (the
+    journal) are left to :meth:`SemanticIndex.sync`, so learning an answer
+    never invalidates the artifact.
+    """
+    keys = list(keys)
+    if not keys or not os.path.exists(json_path):
+        return encode(model, keys)
+
+    source_hash = content_hash(json_path)
+    manifest = read_manifest(json_path)
+    matrix_path, _ = artifact_paths(json_path)
+    if (
+        manifest
+        and manifest.get("source_hash") == source_hash
+        and manifest.get("model") == model_name
+        and manifest.get("keys") == keys
+    ):
+        try:
+            return np.load(matrix_path, mmap_mode="r")
+        except (OSError, ValueError):
+            pass
+
+    embeddings = encode(model, keys)
+    save_embeddings(json_path, keys, embeddings, model_name, source_hash)
+    return np.load(matrix_path, mmap_mode="r")
@@ -0,0 +1,107 @@
+"""Micro-batching of embedding requests across Streamlit sessions.
+
+Each DropBot question needs one forward pass of the sentence encoder, and on
+CPU a batch of 32 short texts costs little more than a single one. A
+:class:`BatchEncoder` owns one background thread: callers queue their text and
+get a :class:`~concurrent.futures.Future`; the thread waits up to ``max_wait``
+seconds for more requests, encodes them together and resolves every future.
+
+It exposes the ``encode`` method of a sentence-transformers model, so it can be
+passed to :class:`~dropbot.semantic.SemanticIndex` in place of the model.
+"""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from .semantic import encode
+
+
+logger = logging.getLogger(__name__)
+
+
+class BatchEncoder:
+    """Shared encoder thread that groups concurrent queries into batches."""
+
+    def __init__(self, model, max_batch=32, max_wait=0.005):
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.batches = 0
+        self.texts = 0
+        self._queue = queue.Queue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="dropbot-encoder", daemon=True)
+        self._thread.start()
+
+    def submit(self, text):
+        """Queue ``text``; the future resolves to its normalized float32 vector."""
+        if self._closed:
+            raise RuntimeError("BatchEncoder is closed")
+        future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def encode(self, texts, **kwargs):
+        """Blocking ``model.encode`` replacement (normalized float32 rows).
+
+        Bulk calls (index builds) are encoded directly on the calling thread;
+        only small ones go through the batching queue.
+        """
+        texts = list(texts)
+        if len(texts) >= self.max_batch:
+            return encode(self.model, texts)
+        futures = [self.submit(text) for text in texts]
+        vectors = [future.result() for future in futures]
+        if not vectors:
+            return encode(self.model, [])
+        return np.stack(vectors)
+
+    def close(self):
+        """Stop the thread once the queued requests are served."""
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+
+    def _collect(self):
+        """Block for one request, then gather more until full or ``max_wait``."""
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)  # arrêt après ce lot
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            # Un appelant qui a abandonné sa future ne coûte rien.
+            batch = [(text, future) for text, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                vectors = encode(self.model, [text for text, _ in batch])
+            except Exception as exc:
+                logger.exception("batch encoding failed")
+                for _, future in batch:
+                    future.set_exception(exc)
+                continue
+            self.batches += 1
+            self.texts += len(batch)
+            for row, (_, future) in zip(vectors, batch):
+                future.set_result(row)
@@ -0,0 +1,84 @@
+"""Compare DropBot match backends on latency and hit rate.
+
+Queries are built from the stored keys with small typos (dropped, swapped and
+duplicated characters, lost accents); a hit means the original key is the top
+result. Usage::
+
+    python -m dropbot.bench qa_data.json --backends fuzzy tfidf
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+import unicodedata
+
+from .matcher import MatcherIndex
+
+
+def perturb(text, rng, edits=2):
+    """Return ``text`` with accents removed and ``edits`` random typos."""
+    text = "".join(
+        c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c)
+    )
+    chars = list(text)
+    for _ in range(edits):
+        if len(chars) < 4:
+            break
+        pos = rng.randrange(len(chars) - 1)
+        action = rng.choice(("drop", "swap", "double"))
+        if action == "drop":
+            del chars[pos]
+        elif action == "swap":
+            chars[pos], chars[pos + 1] = chars[pos + 1], chars[pos]
+        else:
+            chars.insert(pos, chars[pos])
+    return "".join(chars)
+
+
+def build_backend(name, matcher):
+    if name == "fuzzy":
+        return matcher
+    if name == "tfidf":
+        from .lexical import TfidfIndex
+
+        return TfidfIndex(matcher)
+    raise ValueError(f"unknown backend: {name}")
+
+
+def run(backend, queries):
+    """Return ``(hit_rate, mean_ms, p95_ms)`` of ``backend.search``."""
+    hits, timings = 0, []
+    for query, expected in queries:
+        start = time.perf_counter()
+        match, _ = backend.search(query)
+        timings.append((time.perf_counter() - start) * 1000)
+        hits += match == expected
+    timings.sort()
+    p95 = timings[int(0.95 * (len(timings) - 1))]
+    return hits / len(queries), statistics.fmean(timings), p95
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", nargs="?", default="qa_data.json")
+    parser.add_argument("--backends", nargs="+", default=["fuzzy", "tfidf"])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    with open(args.path, "r", encoding="utf-8") as f:
+        qa_pairs = json.load(f)
+    matcher = MatcherIndex(qa_pairs)
+    rng = random.Random(args.seed)
+    sample = rng.sample(matcher.keys, min(args.queries, len(matcher.keys)))
+    queries = [(perturb(key, rng), key) for key in sample]
+
+    print(f"{len(matcher)} keys, {len(queries)} queries")
+    for name in args.backends:
+        hit_rate, mean_ms, p95_ms = run(build_backend(name, matcher), queries)
+        print(f"{name:>8}: hit rate {hit_rate:6.1%}  mean {mean_ms:7.3f} ms  p95 {p95_ms:7.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
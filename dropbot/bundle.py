@@ -0,0 +1,286 @@
+"""Offline compiler of the DropBot knowledge base.
+
+``python questions.py`` (or ``python -m dropbot.bundle``) folds the seed pairs
+of ``questions.py`` and the learned-answers journal into ``qa_data.json``,
+validates and deduplicates the pairs, then compiles a versioned bundle::
+
+    qa_bundle/
+        CURRENT                 ← version served at startup
+        <version>/
+            manifest.json       ← format, source hash, file hashes
+            keys.json           ← keys, their normalized form and aliases
+            tfidf.json          ← n-gram vocabulary and IDF weights
+            tfidf.npz           ← TF-IDF key matrix
+            answers.json        ← every key with the offset of its answer
+            answers.bin         ← answers, read on demand (dropbot.answers)
+            passages.json       ← passage-index vocabulary (dropbot.passages)
+            passages.*.npy      ← passage postings, memory-mapped
+            embeddings.npy      ← optional (--embeddings)
+
+At startup :func:`load_bundle` reads these files instead of normalizing every
+key and refitting the TF-IDF vectorizer in each process. Answers learned after
+the build are not in the bundle; the indexes append them as usual.
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import scipy.sparse as sp
+
+from .answers import AnswerStore, write_answers
+from .artifacts import content_hash
+from .dedupe import filter_aliases, load_aliases
+from .fileio import atomic_write, file_lock
+from .lexical import TfidfIndex
+from .matcher import MatcherIndex
+from .normalize import normalize_text
+from .passages import PASSAGE_ARRAYS, compile_passages, load_passages
+from .store import KnowledgeStore, write_json_atomic
+
+
+FORMAT = 1
+CURRENT = "CURRENT"
+LARGE_FILES = ("embeddings.npy", "answers.bin") + tuple(f"passages.{name}.npy" for name in PASSAGE_ARRAYS)
+
+
+class Bundle:
+    """Precompiled keys and indexes of one bundle version."""
+
+    def __init__(
+        self, path, manifest, keys, norm_keys, tfidf, embeddings=None, aliases=None, answers=None, passages=None
+    ):
+        self.path = path
+        self.manifest = manifest
+        self.keys = keys
+        self.norm_keys = norm_keys
+        self.aliases = aliases or {}
+        self.answers = answers
+        self.passages = passages  # PassageIndex sur les postings mappés en mémoire
+        self.tfidf = tfidf  # (vocabulary, idf, matrix)
+        self.embeddings = embeddings
+
+    @property
+    def version(self):
+        return self.manifest["version"]
+
+    @property
+    def model(self):
+        return self.manifest.get("model")
+
+    def matcher(self, qa_pairs=()):
+        """:class:`MatcherIndex` of the bundle keys, plus any newer ``qa_pairs`` keys."""
+        matcher = MatcherIndex(self.keys, self.norm_keys, self.aliases)
+        for key in qa_pairs:
+            matcher.add(key)
+        return matcher
+
+
+# === Validation ===
+
+
+def validate_pairs(qa_pairs):
+    """Return ``(pairs, problems)``: cleaned, deduplicated pairs and what was dropped.
+
+    Keys and answers must be non-empty strings (surrounding whitespace is
+    stripped); a key that normalizes like an earlier one is a duplicate.
+    """
+    pairs, problems, seen = {}, [], {}
+    for key, answer in qa_pairs.items():
+        if not isinstance(key, str) or not isinstance(answer, str):
+            problems.append(f"type invalide : {key!r}")
+            continue
+        key, answer = key.strip(), answer.strip()
+        if not key or not answer:
+            problems.append(f"clé ou réponse vide : {key!r}")
+            continue
+        norm = normalize_text(key)
+        if not norm:
+            problems.append(f"clé sans lettres ni chiffres : {key!r}")
+            continue
+        if norm in seen:
+            problems.append(f"doublon de {seen[norm]!r} : {key!r}")
+            continue
+        seen[norm] = key
+        pairs[key] = answer
+    return pairs, problems
+
+
+# === Compilation ===
+
+
+def compile_bundle(
+    qa_pairs,
+    out_dir="qa_bundle",
+    source_hash=None,
+    model=None,
+    model_name=None,
+    aliases=None,
+    keep=3,
+    base_hash=None,
+):
+    """Write a new bundle version of ``qa_pairs`` under ``out_dir``; return its path.
+
+    ``aliases`` (see :mod:`dropbot.dedupe`) are left out of the indexes.
+    ``base_hash`` identifies the base file the answers were taken from.
+    """
+    aliases = filter_aliases(aliases or {}, qa_pairs)
+    matcher = MatcherIndex(qa_pairs, aliases=aliases)
+    keys = matcher.keys
+    vocabulary, idf, matrix = TfidfIndex(matcher).state()
+    version = hashlib.sha256(
+        json.dumps([FORMAT, keys, aliases, source_hash, model_name], ensure_ascii=False).encode("utf-8")
+    ).hexdigest()[:12]
+    path = os.path.join(out_dir, version)
+    os.makedirs(path, exist_ok=True)
+
+    def write(name, dump, mode="w"):
+        atomic_write(os.path.join(path, name), dump, mode=mode)
+
+    write(
+        "keys.json",
+        lambda f: json.dump({"keys": keys, "norm_keys": matcher.norm_keys, "aliases": aliases}, f, ensure_ascii=False),
+    )
+    write(
+        "tfidf.json",
+        lambda f: json.dump({"vocabulary": {k: int(v) for k, v in vocabulary.items()}, "idf": idf.tolist()}, f),
+    )
+    write("tfidf.npz", lambda f: sp.save_npz(f, matrix), mode="wb")
+    write_answers(qa_pairs, os.path.join(path, "answers.json"), os.path.join(path, "answers.bin"))
+    compile_passages(qa_pairs, path)
+    if model is not None:
+        from .semantic import encode
+
+        embeddings = encode(model, keys)
+        write("embeddings.npy", lambda f: np.save(f, embeddings), mode="wb")
+
+    names = sorted(name for name in os.listdir(path) if name != "manifest.json")
+    manifest = {
+        "format": FORMAT,
+        "version": version,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "source_hash": source_hash,
+        "base_hash": base_hash,
+        "count": len(keys),
+        "aliases": len(aliases),
+        "model": model_name if model is not None else None,
+        "files": {name: content_hash(os.path.join(path, name)) for name in names},
+    }
+    write("manifest.json", lambda f: json.dump(manifest, f, ensure_ascii=False, indent=2))
+    # Le pointeur CURRENT est réécrit en dernier : une version n'est servie que complète.
+    atomic_write(os.path.join(out_dir, CURRENT), lambda f: f.write(version + "\n"), mode="w")
+    _prune(out_dir, keep, version)
+    return path
+
+
+def _prune(out_dir, keep, current):
+    versions = [
+        entry.path
+        for entry in os.scandir(out_dir)
+        if entry.is_dir() and os.path.exists(os.path.join(entry.path, "manifest.json"))
+    ]
+    versions.sort(key=os.path.getmtime, reverse=True)
+    for path in versions[keep:]:
+        if os.path.basename(path) != current:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def build_knowledge_base(
+    path="qa_data.json", seed=(), out_dir="qa_bundle", model=None, model_name=None, aliases=None
+):
+    """Merge ``seed`` pairs into the knowledge base, clean it and compile its bundle.
+
+    Stored answers win over the seed ones; the journal is folded into the base
+    file. Returns ``(bundle path, problems)``.
+    """
+    store = KnowledgeStore(path)
+    with file_lock(path):
+        data = store.load()
+        for key, answer in dict(seed).items():
+            data.setdefault(key, answer)
+        pairs, problems = validate_pairs(data)
+        write_json_atomic(path, pairs)
+        if os.path.exists(store.journal_path):
+            os.remove(store.journal_path)
+        source_hash = content_hash(path, store.journal_path)
+        base_hash = content_hash(path)
+    bundle_path = compile_bundle(pairs, out_dir, source_hash, model, model_name, aliases, base_hash=base_hash)
+    return bundle_path, problems
+
+
+# === Chargement ===
+
+
+def load_bundle(out_dir="qa_bundle", embeddings=True):
+    """Load the current bundle version, or ``None`` if missing or corrupt."""
+    try:
+        with open(os.path.join(out_dir, CURRENT), "r", encoding="utf-8") as f:
+            path = os.path.join(out_dir, f.read().strip())
+        with open(os.path.join(path, "manifest.json"), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("format") != FORMAT:
+            return None
+        for name, digest in manifest["files"].items():
+            # Les gros fichiers ne sont pas relus au démarrage (mmap) ; AnswerStore vérifie la taille du blob.
+            if name not in LARGE_FILES and content_hash(os.path.join(path, name)) != digest:
+                return None
+        with open(os.path.join(path, "keys.json"), "r", encoding="utf-8") as f:
+            keys = json.load(f)
+        with open(os.path.join(path, "tfidf.json"), "r", encoding="utf-8") as f:
+            tfidf = json.load(f)
+        matrix = sp.load_npz(os.path.join(path, "tfidf.npz")).astype(np.float32)
+        vectors = None
+        if embeddings and "embeddings.npy" in manifest["files"]:
+            vectors = np.load(os.path.join(path, "embeddings.npy"), mmap_mode="r")
+        answers = passages = None
+        if "answers.bin" in manifest["files"]:
+            answers = AnswerStore(os.path.join(path, "answers.json"), os.path.join(path, "answers.bin"))
+            if "passages.json" in manifest["files"]:
+                passages = load_passages(path, answers)
+    except (OSError, ValueError, KeyError):
+        return None
+    idf = np.asarray(tfidf["idf"], dtype=np.float32)
+    return Bundle(
+        path,
+        manifest,
+        keys["keys"],
+        keys["norm_keys"],
+        (tfidf["vocabulary"], idf, matrix),
+        vectors,
+        keys.get("aliases"),
+        answers,
+        passages,
+    )
+
+
+def main(argv=None, seed=()):
+    parser = argparse.ArgumentParser(description="Compile the DropBot knowledge base")
+    parser.add_argument("path", nargs="?", default="qa_data.json")
+    parser.add_argument("--out", default="qa_bundle")
+    parser.add_argument("--embeddings", action="store_true", help="also precompute the embedding matrix")
+    parser.add_argument("--aliases", default="qa_aliases.json", help="alias table from dropbot.dedupe")
+    args = parser.parse_args(argv)
+
+    model = model_name = None
+    if args.embeddings:
+        from .semantic import DEFAULT_MODEL, load_model
+
+        model, model_name = load_model(DEFAULT_MODEL), DEFAULT_MODEL
+    start = time.perf_counter()
+    bundle_path, problems = build_knowledge_base(
+        args.path, seed, args.out, model, model_name, load_aliases(args.aliases)
+    )
+    for problem in problems:
+        print(f"⚠️ {problem}")
+    bundle = load_bundle(args.out, embeddings=False)
+    print(
+        f"✅ {bundle.manifest['count']} clés (+{bundle.manifest['aliases']} alias) compilées dans {bundle_path} "
+        f"({len(problems)} écartée(s), {time.perf_counter() - start:.2f} s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
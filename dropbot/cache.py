@@ -0,0 +1,75 @@
+"""Process-wide LRU cache of DropBot answers.
+
+Entries map a normalized question to its ``(match, score, answer,
+suggestions)`` result and expire after ``ttl`` seconds. Invalidation is
+targeted: when a key is added or changed, only the entries that could now
+resolve differently are dropped.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from .normalize import normalize_text
+
+
+class AnswerCache:
+    """Thread-safe LRU + TTL cache shared by every Streamlit session."""
+
+    def __init__(self, capacity=1024, ttl=3600.0):
+        self.capacity = capacity
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, query):
+        """Return the cached ``(match, score, answer, suggestions)`` or ``None``."""
+        norm = normalize_text(query)
+        with self._lock:
+            entry = self._entries.get(norm)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[norm]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(norm)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, query, match, score, answer, suggestions=()):
+        """Cache the result of matching ``query``."""
+        if self.capacity <= 0:
+            return
+        norm = normalize_text(query)
+        with self._lock:
+            result = (match, score, answer, tuple(suggestions))
+            self._entries[norm] = (time.monotonic() + self.ttl, result)
+            self._entries.move_to_end(norm)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        """Drop what a new or changed ``key`` can affect.
+
+        That is every entry resolved to ``key``, every entry for a question
+        that normalizes like ``key``, and every non-exact entry (the new key
+        may now score higher). Exact hits on other keys stay cached.
+        """
+        norm_key = normalize_text(key)
+        with self._lock:
+            stale = [
+                norm
+                for norm, (_, (match, score, *_)) in self._entries.items()
+                if match == key or norm == norm_key or match is None or score < 100
+            ]
+            for norm in stale:
+                del self._entries[norm]
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,132 @@
+"""Multi-stage DropBot retrieval with early exit.
+
+Stages run from cheapest to most expensive and the first confident hit wins:
+
+1. ``exact``      -- the question is a stored key (dict hit);
+2. ``normalized`` -- same key once case, accents and punctuation are folded;
+3. ``lexical``    -- TF-IDF top-k prefilter; a confident top hit is rescored alone
+                     and returned when the reranker confirms it;
+4. ``rerank``     -- fuzzy or embedding scoring of the k prefilter candidates.
+
+Each stage is timed so the logs show where queries resolve.
+"""
+import logging
+import threading
+import time
+from collections import Counter, namedtuple
+
+from .crosslingual import calibrate
+
+
+logger = logging.getLogger(__name__)
+
+# ``ranked`` : les candidats ``(clé, score)`` du dernier étage atteint,
+# meilleur d'abord (sert aux suggestions « vouliez-vous dire »).
+MatchResult = namedtuple("MatchResult", "key score stage timings ranked")
+
+STAGES = ("exact", "normalized", "lexical", "rerank")
+
+
+class Cascade:
+    """Exact → normalized → lexical prefilter → rerank over the top ``k``."""
+
+    def __init__(self, matcher, prefilter, reranker, k=20, confident=90):
+        self.matcher = matcher
+        self.prefilter = prefilter
+        self.reranker = reranker
+        self.k = k
+        self.threshold = reranker.threshold
+        self.confident = confident
+        self._lock = threading.Lock()
+        self.resolved = Counter()
+        self.reached = Counter()
+        self.elapsed_ms = Counter()
+
+    def __len__(self):
+        return len(self.matcher)
+
+    def add(self, key):
+        """Append ``key`` to every stage; return ``False`` if already present."""
+        added = self.matcher.add(key)
+        self.prefilter.sync()
+        self.reranker.sync()
+        return added
+
+    def _record(self, stage, timings):
+        with self._lock:
+            self.resolved[stage] += 1
+            for name, ms in timings.items():
+                self.reached[name] += 1
+                self.elapsed_ms[name] += ms
+        logger.debug(
+            "resolved at %s (%s)",
+            stage,
+            ", ".join(f"{name} {ms:.3f} ms" for name, ms in timings.items()),
+        )
+
+    def run(self, query):
+        """Run the stages in order and return a :class:`MatchResult`."""
+        timings = {}
+        start = time.perf_counter()
+
+        def lap(stage):
+            nonlocal start
+            now = time.perf_counter()
+            timings[stage] = (now - start) * 1000
+            start = now
+
+        ranked, stage = [], "miss"
+        key = self.matcher.exact(query)
+        lap("exact")
+        if key is not None:
+            ranked, stage = [(key, 100)], "exact"
+        else:
+            key = self.matcher.normalized(query)
+            lap("normalized")
+            if key is not None:
+                ranked, stage = [(key, 100)], "normalized"
+            else:
+                candidates = self.prefilter.top_k(query, self.k)
+                keys = [key for key, _ in candidates]
+                checked = []
+                if candidates and candidates[0][1] >= self.prefilter.confident:
+                    # Sûr selon le pré-filtre : le reranker ne rescore que ce candidat,
+                    # et la sortie anticipée exige qu'il atteigne ``confident``.
+                    checked, keys = self.reranker.rerank(query, keys[:1]), keys[1:]
+                lap("lexical")
+                if checked and checked[0][1] >= self.confident:
+                    # les suivants passent de l'échelle du pré-filtre à celle de la cascade
+                    scales = (self.prefilter.threshold, self.prefilter.confident), (self.threshold, self.confident)
+                    top = checked[0][1]
+                    ranked = checked + [(key, min(top, calibrate(score, *scales))) for key, score in candidates[1:]]
+                    stage = "lexical"
+                elif candidates:
+                    ranked = self.reranker.rerank(query, keys) + checked
+                    ranked.sort(key=lambda pair: pair[1], reverse=True)
+                    lap("rerank")
+                    stage = "rerank" if ranked[0][1] > self.threshold else "miss"
+
+        self._record(stage, timings)
+        if not ranked:
+            return MatchResult(None, 0, stage, timings, ranked)
+        return MatchResult(ranked[0][0], ranked[0][1], stage, timings, ranked)
+
+    def find(self, query):
+        """Best ``(key, score)`` for ``query``."""
+        result = self.run(query)
+        return result.key, result.score
+
+    def find_k(self, query, k=5):
+        """Up to ``k`` ``(key, score)`` candidates from a single cascade run."""
+        return self.run(query).ranked[:k]
+
+    def stats(self):
+        """Per-stage resolution counts and mean time of the queries reaching it."""
+        with self._lock:
+            return {
+                stage: {
+                    "resolved": self.resolved[stage],
+                    "mean_ms": self.elapsed_ms[stage] / max(1, self.reached[stage]),
+                }
+                for stage in STAGES + ("miss",)
+            }
@@ -0,0 +1,83 @@
+"""Cross-lingual routing for DropBot.
+
+Character scorers cannot match an Arabic question against a French key, so
+queries written mostly in Arabic script go straight to the multilingual
+embedding index, where both languages share one vector space; everything else
+keeps using the primary backend. The embedding index is a
+:class:`~dropbot.offload.LazyResource` built by the first Arabic query, on
+the thread that runs it, and its cosine scores are mapped onto the primary
+backend's scale so the caller keeps a single pair of thresholds. While it is
+loading, or if the model cannot be loaded (no network, failed download),
+Arabic queries keep using the primary backend.
+"""
+import re
+
+
+_ARABIC = re.compile("[؀-ۿݐ-ݿࢠ-ࣿﭐ-﷿ﹰ-﻿]")
+_LETTER = re.compile(r"[^\W\d_]")
+
+
+def calibrate(score, source, target):
+    """Map ``score`` linearly from ``source`` to ``target`` ``(threshold, confident)``, bounded to 0-100."""
+    span = (target[1] - target[0]) / (source[1] - source[0])
+    return int(round(min(100, max(0, target[0] + (score - source[0]) * span))))
+
+
+def is_arabic(text):
+    """True when most letters of ``text`` are in Arabic script."""
+    letters = len(_LETTER.findall(text))
+    return letters > 0 and 2 * len(_ARABIC.findall(text)) > letters
+
+
+class CrossLingualRouter:
+    """Send Arabic-script queries to a multilingual :class:`SemanticIndex`."""
+
+    def __init__(self, primary, semantic, threshold=55, confident=70):
+        self.primary = primary
+        self._semantic = semantic
+        # Seuils cosinus (x100) propres au cas arabe → clés françaises :
+        # une traduction score moins haut qu'une paraphrase dans la même langue.
+        self.cross_threshold = threshold
+        self.cross_confident = confident
+
+    @property
+    def threshold(self):
+        return self.primary.threshold
+
+    @property
+    def confident(self):
+        return self.primary.confident
+
+    def __len__(self):
+        return len(self.primary)
+
+    def _calibrate(self, score):
+        return calibrate(score, (self.cross_threshold, self.cross_confident), (self.threshold, self.confident))
+
+    def semantic(self):
+        """The embedding index, or ``None`` while it is loading or unavailable."""
+        return self._semantic.get(wait=False)
+
+    def find(self, query):
+        """Best ``(key, score)`` for ``query`` on the primary backend's scale."""
+        if not is_arabic(query):
+            return self.primary.find(query)
+        best = self.find_k(query, 1)
+        return best[0] if best else (None, 0)
+
+    def find_k(self, query, k=5):
+        """Up to ``k`` ``(key, score)`` candidates on the primary backend's scale."""
+        semantic = self.semantic() if is_arabic(query) else None
+        if semantic is None:
+            return self.primary.find_k(query, k)
+        key = semantic.matcher.lookup(query)
+        if key is not None:
+            return [(key, 100)]
+        return [(key, self._calibrate(score)) for key, score in semantic.top_k(query, k)]
+
+    def add(self, key):
+        """Append ``key`` to the primary backend; the embeddings catch up lazily."""
+        return self.primary.add(key)
+
+    def sync(self):
+        self.primary.sync()
@@ -0,0 +1,124 @@
+"""Near-duplicate key clustering for DropBot.
+
+Many keys of ``qa_data.json`` are paraphrases of each other with (nearly) the
+same answer. This offline tool links two keys when both their normalized
+questions and their answers are close in TF-IDF cosine, groups the links
+with union-find and keeps the first key of each group as its canonical
+entry. The other keys are written to an alias table::
+
+    python -m dropbot.dedupe qa_data.json qa_aliases.json
+
+:class:`~dropbot.matcher.MatcherIndex` then scores queries against the
+canonical keys only; an exact or normalized hit on an alias still returns the
+alias itself, so every stored answer stays reachable.
+"""
+import argparse
+import json
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from .fileio import atomic_write
+from .normalize import normalize_text
+from .store import KnowledgeStore
+
+
+def _tfidf(texts):
+    vectorizer = TfidfVectorizer(analyzer="char_wb", ngram_range=(2, 4), lowercase=False, sublinear_tf=True)
+    return vectorizer.fit_transform([normalize_text(text) for text in texts]).tocsr().astype(np.float32)
+
+
+def similar_pairs(matrix, threshold, batch=1024):
+    """``(i, j)`` with ``i < j`` whose rows have cosine >= ``threshold``."""
+    for start in range(0, matrix.shape[0], batch):
+        block = (matrix[start : start + batch] @ matrix.T).tocoo()
+        rows = block.row + start
+        keep = (block.data >= threshold) & (rows < block.col)
+        yield from zip(rows[keep].tolist(), block.col[keep].tolist())
+
+
+class UnionFind:
+    """Disjoint sets over the positions ``0..n-1``."""
+
+    def __init__(self, n):
+        self.parent = list(range(n))
+
+    def find(self, i):
+        root = i
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[i] != root:  # compression de chemin
+            self.parent[i], i = root, self.parent[i]
+        return root
+
+    def union(self, i, j):
+        # La plus petite position devient la racine : la clé la plus ancienne est canonique.
+        a, b = self.find(i), self.find(j)
+        if a != b:
+            self.parent[max(a, b)] = min(a, b)
+
+
+def cluster_keys(qa_pairs, key_threshold=0.6, answer_threshold=0.6):
+    """Groups of near-duplicate keys (each of size > 1), canonical key first."""
+    keys = list(qa_pairs)
+    if len(keys) < 2:
+        return []
+    questions = _tfidf(keys)
+    answers = _tfidf([qa_pairs[key] for key in keys])
+    groups = UnionFind(len(keys))
+    for i, j in similar_pairs(questions, key_threshold):
+        if answers[i].multiply(answers[j]).sum() >= answer_threshold:
+            groups.union(i, j)
+    clusters = {}
+    for pos in range(len(keys)):
+        clusters.setdefault(groups.find(pos), []).append(keys[pos])
+    return [members for members in clusters.values() if len(members) > 1]
+
+
+def alias_table(clusters):
+    """``{alias: canonical key}`` for the given clusters."""
+    return {alias: members[0] for members in clusters for alias in members[1:]}
+
+
+def filter_aliases(aliases, qa_pairs):
+    """Aliases of ``aliases`` whose key and canonical key are both in ``qa_pairs``.
+
+    A stale table (canonical key since removed) would otherwise hide keys
+    from the fuzzy scan or resolve to a key without an answer.
+    """
+    return {alias: canonical for alias, canonical in aliases.items() if alias in qa_pairs and canonical in qa_pairs}
+
+
+def load_aliases(path="qa_aliases.json"):
+    """Alias table written by this tool, or ``{}`` when missing or unreadable."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cluster near-duplicate DropBot keys")
+    parser.add_argument("path", nargs="?", default="qa_data.json")
+    parser.add_argument("out", nargs="?", default="qa_aliases.json")
+    parser.add_argument("--key-threshold", type=float, default=0.6)
+    parser.add_argument("--answer-threshold", type=float, default=0.6)
+    parser.add_argument("--dry-run", action="store_true", help="print the clusters without writing")
+    args = parser.parse_args(argv)
+
+    qa_pairs = KnowledgeStore(args.path).load()
+    clusters = cluster_keys(qa_pairs, args.key_threshold, args.answer_threshold)
+    for members in clusters:
+        print(f"• {members[0]}")
+        for alias in members[1:]:
+            print(f"    ↳ {alias}")
+    aliases = alias_table(clusters)
+    print(f"{len(qa_pairs)} clés → {len(qa_pairs) - len(aliases)} canoniques, {len(aliases)} alias")
+    if not args.dry_run:
+        atomic_write(args.out, lambda f: json.dump(aliases, f, ensure_ascii=False, indent=2), mode="w")
+        print(f"✅ Table d'alias écrite dans {args.out}")
+
+
+if __name__ == "__main__":
+    main()
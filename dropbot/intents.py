@@ -0,0 +1,174 @@
+"""Small-talk fast path for DropBot.
+
+A linear model over hashed character n-grams is trained once from the
+conversational keys of the knowledge base (greetings, thanks, goodbyes…) and
+answers them before the full-corpus matcher runs. A key is conversational
+when every word of it belongs to the small-talk vocabulary below; the same
+test gates the queries, so "Bonjour, pollution ?" always reaches the full
+matcher. Prediction is a handful of CRC32 hashes and one sparse dot product
+in NumPy, i.e. microseconds.
+"""
+import zlib
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.linear_model import LogisticRegression
+
+from .crosslingual import is_arabic
+from .matcher import fuzzy_score
+from .normalize import normalize_text
+
+
+# Vocabulaire de chaque intention (normalisé à l'import). Il ne sert qu'à
+# étiqueter les clés de la base et à filtrer les questions : les phrases
+# d'apprentissage et les réponses sont toujours des clés de la base.
+INTENT_WORDS = {
+    "greeting": "salut bonjour bonsoir coucou hey hi hello yo salam مرحبًا صباح مساء الخير أهلاً السلام عليكم",
+    "how_are_you": "ça va comment vas tu quoi de neuf كيف حالك الحال ماذا جديد",
+    "thanks": "merci beaucoup bcp bien super شكرًا جزيلًا لك",
+    "goodbye": "au revoir à plus tard bientôt bye ciao bonne journée إلى اللقاء قريبًا مع السلامة",
+}
+# Mots admis dans toutes les intentions (« merci à toi », « مرحبًا يا صديقي »)
+FILLER_WORDS = "toi vous et ami يا صديقي"
+
+INTENT_VOCABULARY = {intent: set(normalize_text(words).split()) for intent, words in INTENT_WORDS.items()}
+FILLERS = set(normalize_text(FILLER_WORDS).split())
+SMALL_TALK_VOCABULARY = set().union(FILLERS, *INTENT_VOCABULARY.values())
+
+OTHER = "other"
+
+
+def intent_of(text):
+    """Intent whose vocabulary covers ``text``, or :data:`OTHER`.
+
+    Every word must be small talk; the intent is the one with the most words.
+    """
+    words = normalize_text(text).split()
+    if not words or not set(words) <= SMALL_TALK_VOCABULARY:
+        return OTHER
+    hits = {intent: sum(word in vocabulary for word in words) for intent, vocabulary in INTENT_VOCABULARY.items()}
+    best = max(hits, key=hits.get)
+    return best if hits[best] else OTHER
+
+
+def ngram_features(text, n_features, ngram_range=(2, 4)):
+    """Hashed ``char_wb`` n-gram counts of the normalized ``text``."""
+    features = {}
+    low, high = ngram_range
+    for word in normalize_text(text).split():
+        padded = f" {word} "
+        for n in range(low, high + 1):
+            for start in range(len(padded) - n + 1):
+                index = zlib.crc32(padded[start : start + n].encode("utf-8")) % n_features
+                features[index] = features.get(index, 0.0) + 1.0
+    return features
+
+
+class SmallTalkModel:
+    """Intent classifier trained from the small-talk keys of the knowledge base."""
+
+    def __init__(self, keys, min_probability=0.8, max_words=4, n_features=1 << 16):
+        self.min_probability = min_probability
+        self.max_words = max_words
+        self.n_features = n_features
+        self.routed = 0
+
+        keys = list(keys)
+        labels = [intent_of(key) for key in keys]
+        self.answers = {intent: [] for intent in INTENT_WORDS}
+        for key, label in zip(keys, labels):
+            if label != OTHER:
+                self.answers[label].append(key)
+        self.classes = []
+        # Il faut au moins une clé de conversation et une autre pour apprendre.
+        if OTHER in labels and len(set(labels)) > 1:
+            self._fit(keys, labels)
+
+    def _vectorize(self, texts):
+        rows, cols, values = [], [], []
+        for row, text in enumerate(texts):
+            for col, value in ngram_features(text, self.n_features).items():
+                rows.append(row)
+                cols.append(col)
+                values.append(value)
+        matrix = sp.csr_matrix((values, (rows, cols)), shape=(len(texts), self.n_features))
+        norms = np.sqrt(matrix.multiply(matrix).sum(axis=1)).A.ravel()
+        norms[norms == 0] = 1.0
+        return sp.diags(1.0 / norms) @ matrix
+
+    def _fit(self, texts, labels):
+        model = LogisticRegression(C=10.0, class_weight="balanced", max_iter=1000)
+        model.fit(self._vectorize(texts), labels)
+        self.classes = list(model.classes_)
+        # Poids stockés par n-gramme (colonnes) pour une prédiction sans sklearn.
+        self._coef = np.ascontiguousarray(model.coef_.T, dtype=np.float32)
+        self._intercept = model.intercept_.astype(np.float32)
+        if len(self.classes) == 2:  # sklearn ne garde qu'une colonne en binaire
+            self._coef = np.hstack([-self._coef, self._coef])
+            self._intercept = np.array([-self._intercept[0], self._intercept[0]], dtype=np.float32)
+
+    def classify(self, query):
+        """Return ``(intent, probability)`` for ``query``."""
+        features = ngram_features(query, self.n_features)
+        if not features or not self.classes:
+            return OTHER, 1.0
+        cols = np.fromiter(features.keys(), dtype=np.intp)
+        values = np.fromiter(features.values(), dtype=np.float32)
+        values /= np.sqrt(values @ values)
+        logits = values @ self._coef[cols] + self._intercept
+        logits = np.exp(logits - logits.max())
+        best = int(np.argmax(logits))
+        return self.classes[best], float(logits[best] / logits.sum())
+
+    def route(self, query):
+        """Stored small-talk key answering ``query``, or ``None``."""
+        words = normalize_text(query).split()
+        # Un seul mot hors du vocabulaire de conversation : c'est une vraie question.
+        if len(words) > self.max_words or not set(words) <= SMALL_TALK_VOCABULARY:
+            return None
+        intent, probability = self.classify(query)
+        if intent == OTHER or probability < self.min_probability or not self.answers[intent]:
+            return None
+        arabic = is_arabic(query)
+        keys = [key for key in self.answers[intent] if is_arabic(key) == arabic] or self.answers[intent]
+        norm_query = normalize_text(query)
+        self.routed += 1
+        return max(keys, key=lambda key: fuzzy_score(norm_query, normalize_text(key)))
+
+
+class SmallTalkRouter:
+    """Answer small talk with ``model`` and hand everything else to ``primary``."""
+
+    def __init__(self, primary, model):
+        self.primary = primary
+        self.model = model
+
+    @property
+    def threshold(self):
+        return self.primary.threshold
+
+    @property
+    def confident(self):
+        return self.primary.confident
+
+    def __len__(self):
+        return len(self.primary)
+
+    def find(self, query):
+        """Small-talk key scored as confident, else the primary backend's match."""
+        key = self.model.route(query)
+        if key is not None:
+            return key, self.confident
+        return self.primary.find(query)
+
+    def find_k(self, query, k=5):
+        key = self.model.route(query)
+        if key is not None:
+            return [(key, self.confident)]
+        return self.primary.find_k(query, k)
+
+    def add(self, key):
+        return self.primary.add(key)
+
+    def sync(self):
+        self.primary.sync()
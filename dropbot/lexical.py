@@ -0,0 +1,181 @@
+"""TF-IDF character n-gram index for DropBot.
+
+The vectorizer is fitted once over the normalized keys; scoring a query is a
+single sparse product against the L2-normalized key matrix, i.e. cosine
+similarity, instead of one Levenshtein computation per key.
+
+Keys learned afterwards are transformed with the fitted vocabulary and
+appended to a tail of CSR rows whose arrays double their capacity when full,
+so an insert is O(1) amortized. The tail is folded into the main matrix once
+it reaches a quarter of its size, so the main matrix is only copied O(log N)
+times as the corpus grows. N-grams never seen at fit time are ignored until
+the next rebuild.
+"""
+import threading
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from .normalize import normalize_text
+from .semantic import top_positions
+
+
+class _RowBuffer:
+    """CSR rows appended in place; the arrays double their capacity when full."""
+
+    def __init__(self, n_features):
+        self.n_features = n_features
+        self.rows = 0
+        self.nnz = 0
+        self._data = np.empty(0, dtype=np.float32)
+        self._indices = np.empty(0, dtype=np.int32)
+        self._indptr = np.zeros(1, dtype=np.int32)
+
+    @staticmethod
+    def _grow(array, size):
+        if size <= len(array):
+            return array
+        grown = np.empty(max(16, size, 2 * len(array)), dtype=array.dtype)
+        grown[: len(array)] = array
+        return grown
+
+    def append(self, rows):
+        """Append the rows of the CSR matrix ``rows`` (single writer at a time)."""
+        rows = rows.tocsr()
+        nnz = self.nnz + rows.nnz
+        count = self.rows + rows.shape[0]
+        self._data = self._grow(self._data, nnz)
+        self._indices = self._grow(self._indices, nnz)
+        self._indptr = self._grow(self._indptr, count + 1)
+        self._data[self.nnz : nnz] = rows.data
+        self._indices[self.nnz : nnz] = rows.indices
+        self._indptr[self.rows + 1 : count + 1] = rows.indptr[1:] + self.nnz
+        self.rows, self.nnz = count, nnz
+
+    def matrix(self):
+        """The rows appended so far, as a CSR view (later appends do not change it)."""
+        return sp.csr_matrix(
+            (self._data[: self.nnz], self._indices[: self.nnz], self._indptr[: self.rows + 1]),
+            shape=(self.rows, self.n_features),
+            copy=False,
+        )
+
+
+class TfidfIndex:
+    """Cosine search over ``char_wb`` n-grams of the keys of a :class:`MatcherIndex`."""
+
+    threshold = 50
+    confident = 90
+
+    def __init__(self, matcher, ngram_range=(2, 4), state=None):
+        self.matcher = matcher
+        self.vectorizer = TfidfVectorizer(
+            analyzer="char_wb",
+            ngram_range=ngram_range,
+            lowercase=False,
+            sublinear_tf=True,
+            dtype=np.float32,
+        )
+        self._lock = threading.Lock()
+        if state is None:
+            self._fit()
+        else:
+            self._restore(*state)
+
+    def _fit(self):
+        norm_keys = list(self.matcher.norm_keys)
+        try:
+            matrix = self.vectorizer.fit_transform(norm_keys).tocsr()
+        except ValueError:  # base vide : aucun n-gramme à apprendre
+            matrix = None
+        # (matrice principale, queue) remplacées ensemble pour les lecteurs
+        self._matrices = (matrix, None)
+        self._indexed = len(norm_keys)
+
+    def _restore(self, vocabulary, idf, matrix):
+        # Index précompilé (voir dropbot.bundle) : ses lignes sont les premières
+        # clés du matcher, les suivantes passent par ``sync``.
+        self.vectorizer.vocabulary_ = vocabulary
+        self.vectorizer.idf_ = idf
+        self._matrices = (matrix.tocsr(), None)
+        self._indexed = matrix.shape[0]
+
+    def state(self):
+        """``(vocabulary, idf, matrix)`` to rebuild this index without refitting."""
+        self.sync()
+        matrix, tail = self._matrices
+        if tail is not None:
+            matrix = sp.vstack([matrix, tail], format="csr")
+        return self.vectorizer.vocabulary_, self.vectorizer.idf_, matrix
+
+    def __len__(self):
+        return len(self.matcher)
+
+    def add(self, key):
+        """Append ``key`` to the live index; return ``False`` if already present."""
+        added = self.matcher.add(key)
+        self.sync()
+        return added
+
+    def sync(self):
+        """Index the keys appended to the shared matcher since the last call."""
+        # ``norm_keys`` est complété après ``keys`` : sa longueur fait foi.
+        if self._indexed == len(self.matcher.norm_keys):
+            return
+        with self._lock:
+            end = len(self.matcher.norm_keys)
+            if self._indexed == end:
+                return
+            matrix, tail = self._matrices
+            if matrix is None:
+                self._fit()
+                return
+            if tail is None:
+                self._tail = _RowBuffer(matrix.shape[1])
+            self._tail.append(self.vectorizer.transform(self.matcher.norm_keys[self._indexed:end]))
+            tail = self._tail.matrix()
+            if tail.shape[0] * 4 >= matrix.shape[0]:
+                matrix, tail = sp.vstack([matrix, tail], format="csr"), None
+            self._matrices = (matrix, tail)
+            self._indexed = end
+
+    def scores(self, query):
+        """Cosine score (0-1) of ``query`` against every key."""
+        self.sync()
+        matrix, tail = self._matrices
+        if matrix is None:
+            return np.zeros(0, dtype=np.float32)
+        vector = self.vectorizer.transform([normalize_text(query)]).T
+        scores = (matrix @ vector).toarray().ravel()
+        if tail is not None:
+            scores = np.concatenate([scores, (tail @ vector).toarray().ravel()])
+        return scores
+
+    def top_k(self, query, k=5):
+        """Return up to ``k`` ``(key, score)`` pairs, best first."""
+        scores = self.scores(query)
+        keys = self.matcher.keys
+        return [
+            (keys[pos], int(round(float(scores[pos]) * 100)))
+            for pos in top_positions(scores, k)
+        ]
+
+    def search(self, query):
+        """Return the best ``(key, score)`` for ``query``."""
+        best = self.top_k(query, 1)
+        return best[0] if best else (None, 0)
+
+    def find_k(self, query, k=5):
+        """Up to ``k`` ``(key, score)`` candidates, best first; a hash hit is alone."""
+        key = self.matcher.lookup(query)
+        if key is not None:
+            return [(key, 100)]
+        return self.top_k(query, k)
+
+    def find(self, query):
+        """Best ``(key, score)`` for ``query``; hash hits score 100."""
+        key = self.matcher.lookup(query)
+        if key is not None:
+            return key, 100
+        return self.search(query)
@@ -0,0 +1,137 @@
+"""Question matching for DropBot.
+
+The index is built once from the loaded ``qa_pairs``: every key is normalized
+a single time, exact and normalized hits are answered from hash tables and the
+fuzzy scorer only runs on pre-normalized strings. The scan scores every key in
+one ``rapidfuzz.process.cdist`` call (C++ loop) instead of one Python call per
+key. Learned keys are appended in place with :meth:`MatcherIndex.add`.
+"""
+import threading
+
+import numpy as np
+from rapidfuzz import fuzz, process
+
+from .normalize import normalize_text
+
+
+# === Index ===
+
+# Les clés sont déjà normalisées : aucun pré-traitement (processor=None), qui
+# supprimerait aussi les lettres arabes. Scores arrondis à l'entier comme
+# ceux de fuzzywuzzy, sur lesquels les seuils ont été réglés.
+
+
+def fuzzy_score(norm_query, norm_key):
+    """WRatio of two normalized strings, 0-100."""
+    return round(fuzz.WRatio(norm_query, norm_key))
+
+
+def fuzzy_scores(norm_query, norm_keys):
+    """WRatio of ``norm_query`` against every string of ``norm_keys`` (int array)."""
+    if not norm_keys:
+        return np.zeros(0, dtype=np.int64)
+    scores = process.cdist([norm_query], norm_keys, scorer=fuzz.WRatio, processor=None, workers=1)[0]
+    return np.rint(scores).astype(np.int64)
+
+
+class MatcherIndex:
+    """Pre-normalized view of the knowledge-base keys."""
+
+    # Seuils sur 100 : au-dessus de ``threshold`` on propose la réponse,
+    # à partir de ``confident`` on la considère comme sûre.
+    threshold = 80
+    confident = 100
+
+    def __init__(self, qa_pairs, norm_keys=None, aliases=None):
+        keys = list(qa_pairs)
+        # ``norm_keys`` précalculées (bundle compilé) : pas de normalisation au démarrage
+        if norm_keys is None:
+            norm_keys = [normalize_text(key) for key in keys]
+        # Alias (voir dropbot.dedupe) : trouvés par hachage, jamais parcourus par le score flou.
+        self.aliases = dict(aliases or {})
+        pairs = [(key, norm) for key, norm in zip(keys, norm_keys) if key not in self.aliases]
+        self.keys = [key for key, _ in pairs]
+        self.norm_keys = [norm for _, norm in pairs]
+        self.positions = {key: pos for pos, key in enumerate(self.keys)}
+        self._normalized = {}
+        for key, norm in pairs:
+            self._normalized.setdefault(norm, key)
+        for alias in self.aliases:
+            self._normalized.setdefault(normalize_text(alias), alias)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, key):
+        """Append ``key`` to the live index; return ``False`` if already present."""
+        with self._lock:
+            if key in self.positions or key in self.aliases:
+                return False
+            norm = normalize_text(key)
+            # Ordre important pour les lecteurs concurrents : une position lue
+            # dans ``norm_keys`` doit toujours exister dans ``keys``.
+            self.keys.append(key)
+            self.norm_keys.append(norm)
+            self.positions[key] = len(self.keys) - 1
+            self._normalized.setdefault(norm, key)
+        return True
+
+    def sync(self):
+        """No-op: the base index is always current (see dependent indexes)."""
+
+    def exact(self, query):
+        """Return ``query`` if it is a stored key (or alias), else ``None``."""
+        return query if query in self.positions or query in self.aliases else None
+
+    def normalized(self, query):
+        """Return the stored key whose normalized form equals ``query``'s."""
+        return self._normalized.get(normalize_text(query))
+
+    def lookup(self, query):
+        """Return the stored key equal to ``query`` (exactly or once normalized)."""
+        key = self.exact(query)
+        if key is None:
+            key = self.normalized(query)
+        return key
+
+    def search(self, query):
+        """Score ``query`` against every key and return ``(key, score)``."""
+        scores = fuzzy_scores(normalize_text(query), self.norm_keys)
+        if not len(scores):
+            return None, 0
+        best_pos = int(scores.argmax())
+        return self.keys[best_pos], int(scores[best_pos])
+
+    def top_k(self, query, k=5):
+        """Return up to ``k`` ``(key, score)`` pairs, best first."""
+        scores = fuzzy_scores(normalize_text(query), self.norm_keys)
+        if len(scores) > k:
+            best = np.argpartition(-scores, k - 1)[:k]
+        else:
+            best = np.arange(len(scores))
+        # tri stable : à score égal, la clé la plus ancienne d'abord
+        best = best[np.lexsort((best, -scores[best]))]
+        return [(self.keys[pos], int(scores[pos])) for pos in best]
+
+    def rerank(self, query, keys):
+        """Score ``query`` against ``keys`` only, best first."""
+        keys = list(keys)
+        scores = fuzzy_scores(normalize_text(query), [self.norm_keys[self.positions[key]] for key in keys])
+        scored = list(zip(keys, scores.tolist()))
+        scored.sort(key=lambda pair: pair[1], reverse=True)
+        return scored
+
+    def find_k(self, query, k=5):
+        """Up to ``k`` ``(key, score)`` candidates, best first; a hash hit is alone."""
+        key = self.lookup(query)
+        if key is not None:
+            return [(key, 100)]
+        return self.top_k(query, k)
+
+    def find(self, query):
+        """Best ``(key, score)`` for ``query``; hash hits score 100."""
+        key = self.lookup(query)
+        if key is not None:
+            return key, 100
+        return self.search(query)
@@ -0,0 +1,171 @@
+"""Log of the questions DropBot could not answer, and their batch clustering.
+
+Every question that ends on the ``awaiting_answer`` path is appended to
+``qa_misses.jsonl`` (one JSON object per line). The file rotates like
+:class:`logging.handlers.RotatingFileHandler`: past ``max_bytes`` it becomes
+``qa_misses.jsonl.1``, the previous ``.1`` becomes ``.2`` and so on, and the
+oldest backup is dropped.
+
+The batch job groups the logged questions with MiniBatchKMeans over TF-IDF
+(or embeddings) and ranks the groups by how often they were asked, so the
+first lines of the report are the ``qa_data.json`` entries that would remove
+the most misses::
+
+    python -m dropbot.misses report --top 20
+"""
+import argparse
+import json
+import math
+import os
+import time
+from collections import Counter
+
+import numpy as np
+from sklearn.cluster import MiniBatchKMeans
+
+from .dedupe import _tfidf
+from .fileio import atomic_write, file_lock
+from .normalize import normalize_text
+from .store import KnowledgeStore
+
+
+class MissLog:
+    """Append-only JSONL log of unanswered questions, rotated by size."""
+
+    def __init__(self, path="qa_misses.jsonl", max_bytes=1_000_000, backups=3):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+
+    def files(self):
+        """Existing log files, oldest first."""
+        names = [f"{self.path}.{i}" for i in range(self.backups, 0, -1)] + [self.path]
+        return [name for name in names if os.path.exists(name)]
+
+    def _rotate(self):
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def record(self, question, best=None, score=0, degraded=False):
+        """Append one miss; ``best`` is the closest key found, if any."""
+        entry = {"q": question, "best": best, "score": round(float(score), 1), "ts": time.time()}
+        if degraded:
+            entry["degraded"] = True
+        line = json.dumps(entry, ensure_ascii=False).encode("utf-8") + b"\n"
+        with file_lock(self.path):
+            if os.path.exists(self.path) and os.path.getsize(self.path) + len(line) > self.max_bytes:
+                self._rotate()
+            # Pas de fsync : perdre les dernières lignes d'un journal d'analyse est sans gravité.
+            with open(self.path, "ab") as f:
+                f.write(line)
+
+    def entries(self):
+        """Logged misses, oldest first; torn lines are skipped."""
+        for name in self.files():
+            with open(name, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:  # ligne tronquée
+                        continue
+
+
+def cluster_misses(entries, n_clusters=None, model=None, covered=(), seed=0):
+    """Group the logged questions; return the clusters, most asked first.
+
+    Questions are counted by their normalized form. Misses of a degraded
+    search (deadline fallback) and questions whose normalized form is in
+    ``covered`` are left out. ``model`` switches the features from TF-IDF
+    to sentence embeddings. Each cluster is a dict with ``count`` (misses),
+    ``questions`` (``[(question, count)]``, most asked first) and ``best``
+    (the key most often found closest, if any).
+    """
+    covered = set(covered)
+    counts, texts, best = Counter(), {}, {}
+    for entry in entries:
+        if entry.get("degraded"):
+            continue
+        norm = normalize_text(entry["q"])
+        if not norm or norm in covered:
+            continue
+        counts[norm] += 1
+        texts.setdefault(norm, entry["q"])
+        if entry.get("best"):
+            best.setdefault(norm, Counter())[entry["best"]] += 1
+    norms = list(counts)
+    if not norms:
+        return []
+    if n_clusters is None:
+        n_clusters = round(math.sqrt(len(norms)))
+    n_clusters = max(1, min(n_clusters, len(norms)))
+    weights = np.asarray([counts[norm] for norm in norms], dtype=np.float32)
+    if n_clusters == 1:
+        labels = np.zeros(len(norms), dtype=np.int64)
+    else:
+        if model is not None:
+            from .semantic import encode
+
+            features = encode(model, [texts[norm] for norm in norms])
+        else:
+            features = _tfidf(norms)
+        kmeans = MiniBatchKMeans(n_clusters=n_clusters, random_state=seed, n_init=10, batch_size=1024)
+        labels = kmeans.fit_predict(features, sample_weight=weights)
+
+    clusters = []
+    for label in np.unique(labels):
+        members = sorted(np.flatnonzero(labels == label), key=lambda pos: -weights[pos])
+        nearest = Counter()
+        for pos in members:
+            nearest.update(best.get(norms[pos], {}))
+        clusters.append(
+            {
+                "count": int(weights[members].sum()),
+                "questions": [(texts[norms[pos]], counts[norms[pos]]) for pos in members],
+                "best": nearest.most_common(1)[0][0] if nearest else None,
+            }
+        )
+    clusters.sort(key=lambda cluster: -cluster["count"])
+    return clusters
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cluster the questions DropBot could not answer")
+    parser.add_argument("--log", default="qa_misses.jsonl")
+    parser.add_argument("--path", default="qa_data.json", help="knowledge base (questions added since are skipped)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    report = commands.add_parser("report", help="rank the clusters of misses by frequency")
+    report.add_argument("--clusters", type=int, default=None, help="default: sqrt(distinct questions)")
+    report.add_argument("--top", type=int, default=20)
+    report.add_argument("--examples", type=int, default=3)
+    report.add_argument("--embeddings", action="store_true", help="cluster sentence embeddings instead of TF-IDF")
+    report.add_argument("--json", dest="out", default=None, help="also write the clusters to this file")
+    args = parser.parse_args(argv)
+
+    model = None
+    if args.embeddings:
+        from .semantic import DEFAULT_MODEL, load_model
+
+        model = load_model(DEFAULT_MODEL)
+    covered = {normalize_text(key) for key in KnowledgeStore(args.path).load()}
+    entries = list(MissLog(args.log).entries())
+    clusters = cluster_misses(entries, args.clusters, model, covered)
+    total = sum(cluster["count"] for cluster in clusters)
+    print(f"{len(entries)} question(s) sans réponse, {total} encore non couvertes, {len(clusters)} groupe(s)")
+    for rank, cluster in enumerate(clusters[: args.top], 1):
+        print(f"{rank:>3}. {cluster['count']:>5} × {cluster['questions'][0][0]}")
+        for question, count in cluster["questions"][1 : args.examples]:
+            print(f"              {count:>3} × {question}")
+        if cluster["best"]:
+            print(f"         ↳ clé la plus proche : {cluster['best']}")
+    if args.out:
+        atomic_write(args.out, lambda f: json.dump(clusters, f, ensure_ascii=False, indent=2), mode="w")
+        print(f"✅ Groupes écrits dans {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""Text normalization shared by every DropBot matcher and the quiz grading.
+
+One compiled pass folds what character scorers would otherwise count as edit
+noise:
+
+* typographic apostrophes (’ ‘ ʼ) and French elisions (l’, d’, qu’…);
+* Latin accents (é → e, ç → c);
+* Arabic tashkeel and tatweel, alef/hamza variants (أ إ آ ٱ → ا, ؤ → و,
+  ئ → ي), taa marbuta (ة → ه), alef maqsura (ى → ي) and Arabic-Indic digits;
+* case, punctuation and repeated whitespace.
+
+Results are memoized: keys are normalized once at index-build time and each
+query once, however many matchers look at it.
+"""
+import re
+import unicodedata
+from functools import lru_cache
+
+
+_CHARACTERS = str.maketrans(
+    {
+        # apostrophes typographiques
+        "’": "'", "‘": "'", "ʼ": "'", "`": "'", "´": "'",
+        # variantes d'alef / hamza, taa marbuta, alef maqsura
+        "أ": "ا", "إ": "ا", "آ": "ا", "ٱ": "ا",
+        "ؤ": "و", "ئ": "ي", "ى": "ي", "ة": "ه",
+        # chiffres arabo-indiens
+        **{chr(0x0660 + d): str(d) for d in range(10)},
+        **{chr(0x06F0 + d): str(d) for d in range(10)},
+    }
+)
+# tashkeel (fatha, damma, kasra, tanwin, shadda, sukun…), alef suscrit, tatweel
+_ARABIC_MARKS = re.compile("[ً-ٰٟـ]")
+_ELISION = re.compile(r"\b(?:jusqu|lorsqu|puisqu|qu|[cdjlmnst])'(?=\w)", re.IGNORECASE)
+_NON_WORD = re.compile(r"[\W_]+")
+
+
+@lru_cache(maxsize=65536)
+def normalize_text(text):
+    """Language-aware matching form of ``text`` (French and Arabic)."""
+    text = text.translate(_CHARACTERS)
+    text = _ARABIC_MARKS.sub("", text)
+    text = _ELISION.sub("", text)
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return _NON_WORD.sub(" ", text.casefold()).strip()
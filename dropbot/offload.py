@@ -0,0 +1,180 @@
+"""Off-thread matching with a deadline for DropBot.
+
+The Streamlit script thread hands the query to a small shared pool and waits
+at most ``timeout`` seconds. Past the deadline, or when the pool is already
+saturated, the answer comes from a cheap lexical fallback instead; the slow
+match keeps running in the background (e.g. finishing a model cold start) but
+no page waits for it. Fallback scores are mapped onto the primary backend's
+scale, like :class:`~dropbot.crosslingual.CrossLingualRouter` does, so the
+caller keeps a single pair of thresholds.
+
+Backends that need the embedding model are held by a :class:`LazyResource`:
+the first query that needs one builds it on the pool thread that runs it, so
+a model cold start falls under the deadline instead of blocking the page, and
+:class:`WarmupRouter` answers from a stand-in index until it is ready.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from .crosslingual import calibrate
+
+
+logger = logging.getLogger(__name__)
+
+
+class MatchPool:
+    """Process-wide thread pool that refuses work beyond ``max_pending`` jobs."""
+
+    def __init__(self, max_workers=4, max_pending=None):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="dropbot-match")
+        self._slots = threading.BoundedSemaphore(max_pending or 2 * max_workers)
+
+    def submit(self, fn, *args):
+        """Run ``fn(*args)`` on the pool, or return ``None`` if it is full."""
+        if not self._slots.acquire(blocking=False):
+            return None
+        try:
+            future = self._executor.submit(fn, *args)
+        except RuntimeError:  # pool arrêté
+            self._slots.release()
+            return None
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class DeadlineRouter:
+    """Match on ``pool`` within ``timeout`` seconds, else use ``fallback``."""
+
+    def __init__(self, primary, fallback, pool, timeout=2.0):
+        self.primary = primary
+        self.fallback = fallback
+        self.pool = pool
+        self.timeout = timeout
+        self.degraded = 0
+
+    @property
+    def threshold(self):
+        return self.primary.threshold
+
+    @property
+    def confident(self):
+        return self.primary.confident
+
+    def __len__(self):
+        return len(self.primary)
+
+    def find_k_timed(self, query, k=5):
+        """Return ``(candidates, degraded)``; ``degraded`` marks a fallback answer."""
+        future = self.pool.submit(self.primary.find_k, query, k)
+        if future is not None:
+            try:
+                return future.result(timeout=self.timeout), False
+            except TimeoutError:
+                logger.warning("matching %r exceeded %.1f s, using the fallback", query, self.timeout)
+        else:
+            logger.warning("match pool saturated, using the fallback for %r", query)
+        self.degraded += 1
+        if self.fallback is None:
+            return [], True
+        source = (self.fallback.threshold, self.fallback.confident)
+        target = (self.threshold, self.confident)
+        return [(key, calibrate(score, source, target)) for key, score in self.fallback.find_k(query, k)], True
+
+    def find_k(self, query, k=5):
+        return self.find_k_timed(query, k)[0]
+
+    def find(self, query):
+        best = self.find_k(query, 1)
+        return best[0] if best else (None, 0)
+
+    def add(self, key):
+        return self.primary.add(key)
+
+    def sync(self):
+        self.primary.sync()
+
+
+class LazyResource:
+    """Process-wide value built by ``factory()`` on first use, by whichever thread asks.
+
+    A failed build is logged and retried after ``retry_after`` seconds.
+    """
+
+    def __init__(self, factory, retry_after=300):
+        self._factory = factory
+        self.retry_after = retry_after
+        self._value = None
+        self._failed_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self):
+        return self._value is not None
+
+    def get(self, wait=True):
+        """The value, building it if needed; ``None`` after a recent failure.
+
+        With ``wait=False`` it also returns ``None`` instead of waiting for a
+        build started by another thread.
+        """
+        if self._value is not None:
+            return self._value
+        if not self._lock.acquire(blocking=wait):
+            return None
+        try:
+            if self._value is None:
+                if self._failed_at is not None and time.monotonic() - self._failed_at < self.retry_after:
+                    return None
+                try:
+                    self._value = self._factory()
+                except Exception:  # modèle absent, réseau coupé, téléchargement interrompu…
+                    logger.warning("building %r failed, retrying in %d s", self._factory, self.retry_after, exc_info=True)
+                    self._failed_at = time.monotonic()
+                    return None
+                self._failed_at = None
+            return self._value
+        finally:
+            self._lock.release()
+
+
+class WarmupRouter:
+    """Answer from ``stand_in`` until the backend held by ``resource`` is built.
+
+    ``threshold`` and ``confident`` are the backend's own, known before it
+    loads; stand-in scores are mapped onto them. The first query builds the
+    backend on its own (pool) thread; queries arriving meanwhile do not wait.
+    """
+
+    def __init__(self, resource, stand_in, threshold, confident):
+        self.resource = resource
+        self.stand_in = stand_in
+        self.threshold = threshold
+        self.confident = confident
+
+    def __len__(self):
+        return len(self.stand_in)
+
+    def find_k(self, query, k=5):
+        backend = self.resource.get(wait=False)
+        if backend is not None:
+            return backend.find_k(query, k)
+        source = (self.stand_in.threshold, self.stand_in.confident)
+        target = (self.threshold, self.confident)
+        return [(key, calibrate(score, source, target)) for key, score in self.stand_in.find_k(query, k)]
+
+    def find(self, query):
+        best = self.find_k(query, 1)
+        return best[0] if best else (None, 0)
+
+    def add(self, key):
+        # Le pis-aller partage le MatcherIndex du backend, qui rattrape les clés
+        # ajoutées à sa prochaine recherche.
+        return self.stand_in.add(key)
+
+    def sync(self):
+        self.stand_in.sync()
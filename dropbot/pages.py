@@ -0,0 +1,220 @@
+"""The app's content pages as a secondary DropBot knowledge source.
+
+The pages of ``test.py`` hold their text as ``translate(fr, ar)`` calls, many
+of them inside f-strings. The extractor finds every call textually and reads
+its two string arguments with :mod:`tokenize` (``ast`` cannot parse
+``test.py`` before Python 3.12 because of backslashes inside f-string
+expressions). Consecutive texts of a page are grouped under their heading into
+passages of ~60 words, in French and in Arabic, and written to
+``page_passages.json``; :func:`load_page_index` turns that file into a
+:class:`~dropbot.passages.PassageIndex`.
+
+Regenerate after editing the pages::
+
+    python -m dropbot.pages extract test.py page_passages.json
+"""
+import argparse
+import ast
+import hashlib
+import io
+import json
+import logging
+import re
+import tokenize
+
+from .fileio import atomic_write
+from .passages import PassageIndex
+
+
+logger = logging.getLogger(__name__)
+
+PAGES = ("Qualité de l'Eau", "Gestion de l'Eau", "Technologies et Innovations", "Impact Environnemental")
+
+_CALL = re.compile(r"(?<![\w.])translate\(")
+_SECTION = re.compile(r"^(?:el)?if choice ?== ?translate\(", re.MULTILINE)
+_HEADING = re.compile(r"<h\d[^>]*>\s*\{?$")
+_MARKUP = re.compile(r"<[^>]+>|\*\*|__|[✔📌✅❌🔹•]")
+_SPACES = re.compile(r"\s+")
+
+
+def _string_value(tokens):
+    """Value of an argument made only of string literals, else ``None``."""
+    parts = []
+    for token in tokens:
+        if token.type in (tokenize.NL, tokenize.NEWLINE, tokenize.COMMENT):
+            continue
+        if token.type != tokenize.STRING:
+            return None
+        literal = token.string
+        prefix = literal[: len(literal) - len(literal.lstrip("rRbBuUfF"))]
+        if "f" in prefix.lower():
+            if "{" in literal:
+                return None  # texte formaté : pas de valeur statique
+            literal = literal.replace(prefix, prefix.lower().replace("f", ""), 1)
+        parts.append(ast.literal_eval(literal))
+    return "".join(parts) if parts else None
+
+
+def _arguments(source, start):
+    """String arguments of the call whose ``(`` ends at ``start``, or ``None``."""
+    args, current, depth = [], [], 0
+    tokens = tokenize.generate_tokens(io.StringIO(source[start:]).readline)
+    try:
+        for token in tokens:
+            if token.type == tokenize.OP and token.string in "([{":
+                depth += 1
+            elif token.type == tokenize.OP and token.string in ")]}":
+                if depth == 0:
+                    args.append(current)
+                    break
+                depth -= 1
+            elif token.type == tokenize.OP and token.string == "," and depth == 0:
+                args.append(current)
+                current = []
+                continue
+            current.append(token)
+        else:
+            return None
+    except (tokenize.TokenError, IndentationError, SyntaxError):
+        return None
+    values = [_string_value(arg) for arg in args if arg]
+    return values if len(values) == 2 and None not in values else None
+
+
+def translate_calls(source):
+    """``(offset, fr, ar, is_heading)`` for every static ``translate`` call."""
+    for match in _CALL.finditer(source):
+        if source[max(0, match.start() - 4) : match.start()] == "def ":
+            continue
+        values = _arguments(source, match.end())
+        if values is None:
+            continue
+        line_start = source.rfind("\n", 0, match.start()) + 1
+        heading = bool(_HEADING.search(source[line_start : match.start()]))
+        yield match.start(), values[0], values[1], heading
+
+
+def _clean(text):
+    return _SPACES.sub(" ", _MARKUP.sub(" ", text)).strip()
+
+
+def _group(texts, max_words):
+    """Split aligned ``(fr, ar, heading)`` texts into passages under headings."""
+    passages, title, fr, ar, words = [], None, [], [], 0
+
+    def flush():
+        if fr:
+            passages.append({"title": title, "fr": " ".join(fr), "ar": " ".join(ar)})
+
+    for text_fr, text_ar, heading in texts:
+        if heading:
+            flush()
+            title, fr, ar, words = (text_fr, text_ar), [], [], 0
+            continue
+        n = len(text_fr.split())
+        if fr and words + n > max_words:
+            flush()
+            fr, ar, words = [], [], 0
+        fr.append(text_fr)
+        ar.append(text_ar)
+        words += n
+    flush()
+    return passages
+
+
+def page_sections(source, pages=PAGES):
+    """``(names, start, end)`` of the sections of ``source`` showing ``pages``."""
+    sections = [(m.start(), _arguments(source, m.end())) for m in _SECTION.finditer(source)]
+    bounds = [start for start, _ in sections[1:]] + [len(source)]
+    for (start, names), end in zip(sections, bounds):
+        if names and names[0] in pages:
+            yield names, start, end
+
+
+def pages_hash(source_path, pages=PAGES):
+    """SHA-256 of the page sections of ``source_path`` (other edits keep it)."""
+    with open(source_path, "r", encoding="utf-8") as f:
+        source = f.read()
+    digest = hashlib.sha256()
+    for _, start, end in page_sections(source, pages):
+        digest.update(source[start:end].encode("utf-8"))
+    return digest.hexdigest()
+
+
+def extract_pages(source, pages=PAGES, max_words=60):
+    """Bilingual passages of the page sections of ``source``."""
+    calls = list(translate_calls(source))
+    out = []
+    for names, start, end in page_sections(source, pages):
+        texts = [
+            (_clean(fr), _clean(ar), heading)
+            for offset, fr, ar, heading in calls
+            if start < offset < end and offset > source.index("\n", start)
+        ]
+        for passage in _group([t for t in texts if t[0] and t[1]], max_words):
+            title = passage["title"] or (None, None)
+            out.append(
+                {
+                    "page_fr": names[0],
+                    "page_ar": names[1],
+                    "title_fr": title[0],
+                    "title_ar": title[1],
+                    "fr": passage["fr"],
+                    "ar": passage["ar"],
+                }
+            )
+    return out
+
+
+def build(source_path, out_path, pages=PAGES, max_words=60):
+    """Extract the passages of ``source_path`` into ``out_path``; return their count."""
+    with open(source_path, "r", encoding="utf-8") as f:
+        passages = extract_pages(f.read(), pages, max_words)
+    data = {"source_hash": pages_hash(source_path, pages), "passages": passages}
+    atomic_write(out_path, lambda f: json.dump(data, f, ensure_ascii=False, indent=1), mode="w")
+    return len(passages)
+
+
+def load_page_index(path="page_passages.json", source=None):
+    """:class:`PassageIndex` over both languages of ``path`` (``None`` if missing).
+
+    With ``source``, a warning is logged when its page sections changed
+    since the passages were extracted.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        passages = data["passages"]
+    except (OSError, ValueError, KeyError):
+        return None
+    if source is not None and data.get("source_hash") != pages_hash(source):
+        logger.warning("%s is out of date with %s; run python -m dropbot.pages extract", path, source)
+    grouped = {}
+    for passage in passages:
+        for lang in ("fr", "ar"):
+            title = passage[f"title_{lang}"]
+            text = f"{title} : {passage[lang]}" if title else passage[lang]
+            grouped.setdefault(passage[f"page_{lang}"], []).append(text)
+    index = PassageIndex()
+    # Les questions sont formulées librement face à des textes descriptifs :
+    # une couverture partielle suffit pour proposer le passage.
+    index.threshold = 35
+    for page, texts in grouped.items():
+        index.add_passages(page, texts)
+    return index
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="DropBot content-page passages")
+    sub = parser.add_subparsers(dest="command", required=True)
+    extract = sub.add_parser("extract", help="extract translate() page texts into passages")
+    extract.add_argument("source", nargs="?", default="test.py")
+    extract.add_argument("out", nargs="?", default="page_passages.json")
+    extract.add_argument("--max-words", type=int, default=60)
+    args = parser.parse_args(argv)
+    count = build(args.source, args.out, max_words=args.max_words)
+    print(f"{count} passages → {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+"""Answer-side retrieval for DropBot.
+
+Keys only cover the way a question was first asked, while the stored answers
+hold many more facts. Each answer is split into passages of a few sentences
+and indexed in an in-memory BM25 inverted index; when a question misses on
+the keys, the best passage can still answer it.
+
+Scores are reported on a 0-100 scale as the IDF-weighted share of the query
+terms that the passage contains, so they can be compared with thresholds.
+Passage texts of the initial ``qa_pairs`` are not kept in memory: a hit
+re-chunks its answer. Built from ``qa_pairs`` the postings still live in
+memory; :func:`compile_passages` writes them into the bundle as ``.npy``
+arrays that :func:`load_passages` memory-maps, so only the term vocabulary is
+resident and answers are read from the :class:`~dropbot.answers.AnswerStore`.
+"""
+import json
+import math
+import os
+import re
+import threading
+
+import numpy as np
+
+from .fileio import atomic_write
+from .normalize import normalize_text
+from .semantic import top_positions
+
+
+PASSAGE_ARRAYS = ("indptr", "pids", "tfs", "keys", "ranks", "lengths")
+
+
+_SENTENCE_END = re.compile(r"(?<=[.!?؟…])\s+|\n+")
+
+
+def chunk_answer(text, max_words=50):
+    """Split ``text`` into passages of whole sentences, ``max_words`` at most."""
+    passages, current, words = [], [], 0
+    for sentence in _SENTENCE_END.split(text):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        n = len(sentence.split())
+        if current and words + n > max_words:
+            passages.append(" ".join(current))
+            current, words = [], 0
+        current.append(sentence)
+        words += n
+    if current:
+        passages.append(" ".join(current))
+    return passages
+
+
+class CompiledPassages:
+    """Memory-mapped postings written by :func:`compile_passages`.
+
+    ``arrays`` holds CSR postings (``indptr`` by term row, ``pids``,
+    ``tfs``) and, per passage, the position of its key in ``key_list``, its
+    rank in the chunked answer and its length in terms.
+    """
+
+    def __init__(self, vocabulary, arrays, key_list, answers):
+        self.vocabulary = vocabulary
+        self.key_list = key_list
+        self.answers = answers
+        for name in PASSAGE_ARRAYS:
+            setattr(self, name, arrays[name])
+        n = len(self.lengths)
+        if len(self.indptr) != len(vocabulary) + 1 or not len(self.pids) == len(self.tfs) == self.indptr[-1]:
+            raise ValueError("inconsistent passage postings")
+        if len(self.keys) != n or len(self.ranks) != n:
+            raise ValueError("inconsistent passage table")
+        self._key_pos = {key: pos for pos, key in enumerate(key_list)}
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def postings(self, term):
+        row = self.vocabulary.get(term)
+        if row is None:
+            return None, None
+        start, end = self.indptr[row], self.indptr[row + 1]
+        return self.pids[start:end], self.tfs[start:end]
+
+    def key(self, pid):
+        return self.key_list[self.keys[pid]]
+
+    def pids_of(self, key):
+        pos = self._key_pos.get(key)
+        return [] if pos is None else np.flatnonzero(np.asarray(self.keys) == pos).tolist()
+
+
+class PassageIndex:
+    """BM25 inverted index over passages of the stored answers."""
+
+    threshold = 60
+    confident = 90
+
+    def __init__(self, qa_pairs=None, max_words=50, min_terms=2, k1=1.2, b=0.75, compiled=None):
+        self.max_words = max_words
+        self.min_terms = min_terms
+        self.k1 = k1
+        self.b = b
+        # Passages compilés (pids 0..n_base-1), puis ceux ajoutés en mémoire.
+        self._base = compiled
+        self._n_base = len(compiled) if compiled is not None else 0
+        self.keys = []  # passage → clé dont la réponse le contient
+        self.texts = []  # texte, ou rang du passage dans la réponse de ``_source``
+        self.lengths = []
+        self._postings = {}  # terme → ([passage], [tf])
+        self._by_key = {}
+        self._removed = set()
+        self._lock = threading.Lock()
+        self._source = qa_pairs if qa_pairs is not None else {}
+        for key in self._source:
+            self.add_passages(key, chunk_answer(self._source[key], max_words), lazy=True)
+
+    def __len__(self):
+        return self._n_base + len(self.texts) - len(self._removed)
+
+    def __contains__(self, key):
+        """True when passages are indexed under ``key``."""
+        return key in self._by_key or (self._base is not None and bool(self._base.pids_of(key)))
+
+    def add(self, key, answer):
+        """Index the passages of ``answer``, replacing those of a previous one."""
+        self.add_passages(key, chunk_answer(answer, self.max_words))
+
+    def add_passages(self, key, passages, lazy=False):
+        """Index already chunked ``passages`` under ``key`` (replacing its old ones).
+
+        With ``lazy`` the text is re-read from the source mapping when hit.
+        """
+        with self._lock:
+            old = self._by_key.pop(key, None)
+            if old is None and self._base is not None:
+                old = self._base.pids_of(key)
+            self._removed.update(old or ())
+            ids = []
+            for rank, passage in enumerate(passages):
+                terms = normalize_text(passage).split()
+                if not terms:
+                    continue
+                pid = self._n_base + len(self.texts)
+                # Longueur et texte d'abord : un passage référencé est toujours complet.
+                self.lengths.append(len(terms))
+                self.texts.append(rank if lazy else passage)
+                self.keys.append(key)
+                counts = {}
+                for term in terms:
+                    counts[term] = counts.get(term, 0) + 1
+                for term, tf in counts.items():
+                    pids, tfs = self._postings.setdefault(term, ([], []))
+                    tfs.append(tf)
+                    pids.append(pid)
+                ids.append(pid)
+            self._by_key[key] = ids
+
+    def _key(self, pid):
+        if pid < self._n_base:
+            return self._base.key(pid)
+        return self.keys[pid - self._n_base]
+
+    def _text(self, pid):
+        if pid < self._n_base:
+            answer = self._base.answers[self._base.key(pid)]
+            return chunk_answer(answer, self.max_words)[int(self._base.ranks[pid])]
+        text = self.texts[pid - self._n_base]
+        if isinstance(text, int):
+            return chunk_answer(self._source[self.keys[pid - self._n_base]], self.max_words)[text]
+        return text
+
+    def _idf(self, df, n):
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def search(self, query, k=3):
+        """Up to ``k`` ``(key, passage, score)`` triples, best first."""
+        terms = list(dict.fromkeys(normalize_text(query).split()))
+        n_live = len(self.texts)
+        n = self._n_base + n_live
+        if len(terms) < self.min_terms or not n:
+            return []
+        lengths = np.asarray(self.lengths[:n_live], dtype=np.float32)
+        if self._n_base:
+            lengths = np.concatenate([np.asarray(self._base.lengths, dtype=np.float32), lengths])
+        norm = self.k1 * (1 - self.b + self.b * lengths / lengths.mean())
+        bm25 = np.zeros(n, dtype=np.float32)
+        coverage = np.zeros(n, dtype=np.float32)
+        total = 0.0
+        for term in terms:
+            pids, tfs = self._postings.get(term, ((), ()))
+            size = len(pids)
+            ids = np.asarray(pids[:size], dtype=np.intp)
+            tf = np.asarray(tfs[:size], dtype=np.float32)
+            if len(ids) and ids[-1] >= n:
+                # passages ajoutés par une autre session pendant la recherche
+                live = ids < n
+                ids, tf = ids[live], tf[live]
+            if self._n_base:
+                base_ids, base_tf = self._base.postings(term)
+                if base_ids is not None:
+                    ids = np.concatenate([np.asarray(base_ids, dtype=np.intp), ids])
+                    tf = np.concatenate([np.asarray(base_tf, dtype=np.float32), tf])
+            idf = self._idf(len(ids), n)
+            total += idf
+            if not len(ids):
+                continue
+            bm25[ids] += idf * tf * (self.k1 + 1) / (tf + norm[ids])
+            coverage[ids] += idf
+        removed = [pid for pid in list(self._removed) if pid < n]
+        if removed:
+            bm25[removed] = 0
+        results = []
+        for pid in top_positions(bm25, k):
+            if bm25[pid] <= 0:
+                break
+            score = int(round(100 * float(coverage[pid]) / total))
+            results.append((self._key(pid), self._text(pid), score))
+        return results
+
+    def find(self, query):
+        """Best ``(key, passage, score)`` for ``query``, or ``(None, None, 0)``."""
+        best = self.search(query, 1)
+        return best[0] if best else (None, None, 0)
+
+
+# === Index compilé (bundle) ===
+
+
+def compile_passages(qa_pairs, directory, max_words=50):
+    """Write the passage index of ``qa_pairs`` into ``directory``."""
+    index = PassageIndex(qa_pairs, max_words)
+    key_pos = {key: pos for pos, key in enumerate(qa_pairs)}
+    vocabulary = list(index._postings)
+    indptr, pids, tfs = [0], [], []
+    for term in vocabulary:
+        term_pids, term_tfs = index._postings[term]
+        pids.extend(term_pids)
+        tfs.extend(term_tfs)
+        indptr.append(len(pids))
+    arrays = {
+        "indptr": np.asarray(indptr, dtype=np.int64),
+        "pids": np.asarray(pids, dtype=np.int32),
+        "tfs": np.minimum(tfs, np.iinfo(np.uint16).max).astype(np.uint16),
+        "keys": np.asarray([key_pos[key] for key in index.keys], dtype=np.int32),
+        "ranks": np.asarray(index.texts, dtype=np.int32),
+        "lengths": np.asarray(index.lengths, dtype=np.int32),
+    }
+    for name, array in arrays.items():
+        atomic_write(os.path.join(directory, f"passages.{name}.npy"), lambda f, a=array: np.save(f, a))
+    meta = {"max_words": max_words, "vocabulary": vocabulary}
+    atomic_write(os.path.join(directory, "passages.json"), lambda f: json.dump(meta, f, ensure_ascii=False), mode="w")
+
+
+def load_passages(directory, answers, **kwargs):
+    """:class:`PassageIndex` over the compiled postings of ``directory``.
+
+    ``answers`` maps the keys, in the order given to :func:`compile_passages`,
+    to their answers (the bundle's :class:`~dropbot.answers.AnswerStore`).
+    """
+    with open(os.path.join(directory, "passages.json"), "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    arrays = {name: np.load(os.path.join(directory, f"passages.{name}.npy"), mmap_mode="r") for name in PASSAGE_ARRAYS}
+    vocabulary = {term: row for row, term in enumerate(meta["vocabulary"])}
+    compiled = CompiledPassages(vocabulary, arrays, list(answers), answers)
+    return PassageIndex(max_words=meta["max_words"], compiled=compiled, **kwargs)
@@ -0,0 +1,218 @@
+"""Embedding-based retrieval for DropBot.
+
+Key embeddings are computed once, L2-normalized and stored as one contiguous
+float32 matrix, so scoring a query is a single matrix-vector product. Learned
+keys are encoded one at a time into a growable tail next to that matrix.
+Past ~100k keys, :meth:`SemanticIndex.enable_ann` swaps the brute-force scan
+for an IVF index (:mod:`dropbot.ann`), and ``quantization`` keeps int8 or
+1-bit codes in RAM instead of float32 (:mod:`dropbot.quantize`).
+"""
+import threading
+
+import numpy as np
+
+
+# Modèle multilingue : les clés sont en français et en arabe.
+DEFAULT_MODEL = "paraphrase-multilingual-MiniLM-L12-v2"
+
+
+def load_model(name=DEFAULT_MODEL):
+    """Load a sentence-transformers model (imported lazily, it pulls in torch)."""
+    from sentence_transformers import SentenceTransformer
+
+    return SentenceTransformer(name)
+
+
+def encode(model, texts):
+    """Encode ``texts`` into an L2-normalized float32 matrix."""
+    vectors = model.encode(
+        list(texts),
+        convert_to_numpy=True,
+        normalize_embeddings=True,
+        show_progress_bar=False,
+    )
+    return np.ascontiguousarray(vectors, dtype=np.float32)
+
+
+def top_positions(scores, k):
+    """Positions of the ``k`` largest ``scores``, best first."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    if k < len(scores):
+        part = np.argpartition(-scores, k - 1)[:k]
+    else:
+        part = np.arange(len(scores))
+    return part[np.argsort(-scores[part], kind="stable")]
+
+
+class EmbeddingMatrix:
+    """Read-only base rows (possibly memory-mapped) plus a growable tail.
+
+    The tail doubles its capacity when full, so appending a row is O(1)
+    amortized and the base matrix is never copied.
+    """
+
+    def __init__(self, base, dtype=np.float32):
+        self.base = base
+        self.dtype = dtype
+        self._tail = None
+        self._size = 0
+
+    def __len__(self):
+        return len(self.base) + self._size
+
+    def append(self, vectors):
+        """Append the rows of ``vectors`` (single writer at a time)."""
+        vectors = np.asarray(vectors, dtype=self.dtype)
+        size = self._size + len(vectors)
+        tail = self._tail
+        if tail is None or size > len(tail):
+            capacity = max(16, size, 2 * (0 if tail is None else len(tail)))
+            grown = np.empty((capacity, vectors.shape[1]), dtype=self.dtype)
+            if self._size:
+                grown[: self._size] = tail[: self._size]
+            tail = grown
+        tail[self._size : size] = vectors
+        # Les lecteurs lisent ``_size`` avant ``_tail`` : jamais de ligne vide.
+        self._tail = tail
+        self._size = size
+
+    def dot(self, vector):
+        """Scores of every row against ``vector``."""
+        size = self._size
+        tail = self._tail
+        scores = self.base @ vector if len(self.base) else np.zeros(0, np.float32)
+        if size:
+            scores = np.concatenate([scores, tail[:size] @ vector])
+        return scores
+
+    def __getitem__(self, positions):
+        if isinstance(positions, slice):
+            positions = np.arange(len(self))[positions]
+        return self.rows(positions)
+
+    def rows(self, positions):
+        """Rows at ``positions`` as one float32 matrix."""
+        positions = np.asarray(positions, dtype=np.intp)
+        n_base = len(self.base)
+        if self._tail is None or (positions < n_base).all():
+            return np.asarray(self.base[positions])
+        out = np.empty((len(positions), self._tail.shape[1]), dtype=self.dtype)
+        in_base = positions < n_base
+        out[in_base] = self.base[positions[in_base]]
+        out[~in_base] = self._tail[positions[~in_base] - n_base]
+        return out
+
+    def search(self, vector, k):
+        """``(positions, scores)`` of the ``k`` rows closest to ``vector``."""
+        scores = self.dot(vector)
+        best = top_positions(scores, k)
+        return best, scores[best]
+
+    def search_rows(self, positions, vector, k):
+        """Like :meth:`search`, restricted to the rows at ``positions``."""
+        scores = self.rows(positions) @ vector
+        best = top_positions(scores, k)
+        return np.asarray(positions)[best], scores[best]
+
+
+class SemanticIndex:
+    """Cosine search over the keys of a :class:`MatcherIndex`."""
+
+    threshold = 60
+    confident = 80
+
+    def __init__(self, matcher, model, embeddings=None, quantization=None):
+        self.matcher = matcher
+        self.model = model
+        if embeddings is None:
+            embeddings = encode(model, matcher.keys)
+        if quantization:
+            from .quantize import QuantizedMatrix
+
+            self.embeddings = QuantizedMatrix(embeddings, quantization)
+        else:
+            self.embeddings = EmbeddingMatrix(embeddings)
+        self.ann = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.matcher)
+
+    def add(self, key):
+        """Append ``key`` to the live index; return ``False`` if already present."""
+        added = self.matcher.add(key)
+        self.sync()
+        return added
+
+    def sync(self):
+        """Encode the keys appended to the shared matcher since the last call."""
+        if len(self.embeddings) == len(self.matcher.norm_keys):
+            return
+        with self._lock:
+            start, end = len(self.embeddings), len(self.matcher.norm_keys)
+            if start < end:
+                vectors = encode(self.model, self.matcher.keys[start:end])
+                self.embeddings.append(vectors)
+                if self.ann is not None:
+                    self.ann.add(vectors, np.arange(start, end, dtype=np.int64))
+
+    def enable_ann(self, nlist=None, nprobe=8):
+        """Serve :meth:`top_k` from an IVF index built over the current embeddings.
+
+        ``nprobe`` trades recall for latency; learned keys are appended to
+        the index as they are encoded. With quantization the cells hold only
+        ids and the probed rows are scored from the codes.
+        """
+        from .ann import IVFIndex
+
+        self.sync()
+        with self._lock:
+            quantized = not isinstance(self.embeddings, EmbeddingMatrix)
+            self.ann = IVFIndex.build(
+                self.embeddings, nlist=nlist, nprobe=nprobe, matrix=self.embeddings if quantized else None
+            )
+
+    def top_k(self, query, k=5):
+        """Return up to ``k`` ``(key, score)`` pairs, best first."""
+        self.sync()
+        if not len(self):
+            return []
+        vector = encode(self.model, [query])[0]
+        keys = self.matcher.keys
+        index = self.embeddings if self.ann is None else self.ann
+        positions, scores = index.search(vector, k)
+        return [(keys[pos], int(round(float(score) * 100))) for pos, score in zip(positions, scores)]
+
+    def rerank(self, query, keys):
+        """Score ``query`` against the embeddings of ``keys`` only, best first."""
+        self.sync()
+        keys = list(keys)
+        if not keys:
+            return []
+        rows = [self.matcher.positions[key] for key in keys]
+        scores = self.embeddings.rows(rows) @ encode(self.model, [query])[0]
+        return [
+            (keys[pos], int(round(float(scores[pos]) * 100)))
+            for pos in top_positions(scores, len(keys))
+        ]
+
+    def search(self, query):
+        """Return the ``(key, score)`` whose embedding is closest to ``query``."""
+        best = self.top_k(query, 1)
+        return best[0] if best else (None, 0)
+
+    def find_k(self, query, k=5):
+        """Up to ``k`` ``(key, score)`` candidates, best first; a hash hit is alone."""
+        key = self.matcher.lookup(query)
+        if key is not None:
+            return [(key, 100)]
+        return self.top_k(query, k)
+
+    def find(self, query):
+        """Best ``(key, score)`` for ``query``; hash hits skip the model."""
+        key = self.matcher.lookup(query)
+        if key is not None:
+            return key, 100
+        return self.search(query)
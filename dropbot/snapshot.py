@@ -0,0 +1,372 @@
+"""Compressed, versioned snapshots of the DropBot knowledge base.
+
+A snapshot is the knowledge base as JSON Lines (one ``{"q", "a"}`` object per
+pair) compressed with ``zlib`` (gzip framing), ``lzma`` or, when the optional
+``zstandard`` package is installed, ``zstd``. When the compiled ``qa_bundle``
+matches those pairs exactly, its files (keys, TF-IDF, answers, passages,
+embeddings) are kept alongside as a compressed tar stream, so the derived
+indexes come back without recompiling or re-encoding anything.
+``qa_snapshots/manifest.json`` lists every version with its codec, sizes and
+SHA-256 and points at the current one. Pairs and bundle files are decoded as
+streams, never as a whole decompressed file in memory.
+
+::
+
+    python -m dropbot.snapshot save --codec lzma   # qa_data.json + journal → new version
+    python -m dropbot.snapshot list
+    python -m dropbot.snapshot rollback            # qa_data.json ← previous version
+
+Rolling back first snapshots the current state (journal included), then
+rewrites ``qa_data.json``, drops the journal and brings the bundle back; the
+manifest only points at the restored version once all of that succeeded.
+"""
+import argparse
+import gzip
+import hashlib
+import io
+import json
+import lzma
+import os
+import shutil
+import tarfile
+import time
+
+from .artifacts import content_hash
+from .bundle import CURRENT, compile_bundle, load_bundle
+from .dedupe import load_aliases
+from .fileio import atomic_write, file_lock
+from .store import KnowledgeStore, write_json_atomic
+
+
+FORMAT = 1
+MANIFEST = "manifest.json"
+
+
+def _open_zstd(path, mode):
+    try:
+        import zstandard
+    except ImportError:
+        raise ValueError("the zstd codec needs the zstandard package") from None
+    return zstandard.open(path, mode)
+
+
+def _open_lzma(path, mode):
+    # lzma refuse un preset en lecture
+    return lzma.open(path, mode, preset=6) if "w" in mode else lzma.open(path, mode)
+
+
+# codec → (extension, open(path, binary mode))
+CODECS = {
+    "zlib": (".gz", lambda path, mode: gzip.open(path, mode, compresslevel=6)),
+    "lzma": (".xz", _open_lzma),
+    "zstd": (".zst", _open_zstd),
+}
+
+
+def matching_bundle(store, bundle_dir="qa_bundle"):
+    """The current bundle if it holds exactly the pairs of ``store``, else ``None``.
+
+    It must have been compiled from the present base file, with no answer
+    learned since (empty journal).
+    """
+    bundle = load_bundle(bundle_dir, embeddings=False)
+    if bundle is None or bundle.manifest.get("base_hash") != content_hash(store.path):
+        return None
+    if next(store.replay(), None) is not None:
+        return None
+    return bundle
+
+
+class SnapshotStore:
+    """Versioned compressed snapshots in ``directory`` with a manifest."""
+
+    def __init__(self, directory="qa_snapshots"):
+        self.directory = directory
+        self.manifest_path = os.path.join(directory, MANIFEST)
+
+    # === Manifeste ===
+
+    def manifest(self):
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"format": FORMAT, "current": None, "versions": []}
+
+    def _write_manifest(self, manifest):
+        atomic_write(
+            self.manifest_path, lambda f: json.dump(manifest, f, ensure_ascii=False, indent=2), mode="w"
+        )
+
+    def versions(self):
+        """Version entries, oldest first."""
+        return self.manifest()["versions"]
+
+    def current(self):
+        """Entry of the current version, or ``None``."""
+        manifest = self.manifest()
+        return next((v for v in manifest["versions"] if v["version"] == manifest["current"]), None)
+
+    def entry(self, version=None):
+        """Entry of ``version`` (default: current); ``KeyError`` if unknown."""
+        if version is None:
+            entry = self.current()
+        else:
+            entry = next((v for v in self.versions() if v["version"] == version), None)
+        if entry is None:
+            raise KeyError(f"no snapshot {version or '(current)'} in {self.directory}")
+        return entry
+
+    def ancestor(self, steps=1):
+        """Entry ``steps`` parents before the current version."""
+        manifest = self.manifest()
+        by_version = {v["version"]: v for v in manifest["versions"]}
+        version = manifest["current"]
+        for _ in range(steps):
+            parent = by_version[version]["parent"] if version in by_version else None
+            if parent is None or parent not in by_version:
+                raise KeyError(f"no snapshot {steps} step(s) before {manifest['current']}")
+            version = parent
+        return by_version[version]
+
+    def set_current(self, version):
+        """Point the manifest at ``version``."""
+        with file_lock(self.manifest_path):
+            manifest = self.manifest()
+            if not any(v["version"] == version for v in manifest["versions"]):
+                raise KeyError(f"no snapshot {version} in {self.directory}")
+            manifest["current"] = version
+            self._write_manifest(manifest)
+
+    # === Écriture ===
+
+    @staticmethod
+    def _write_pairs(path, open_codec, qa_pairs):
+        digest = hashlib.sha256()
+        raw_size = 0
+        with open_codec(path, "wb") as f:
+            for question, answer in qa_pairs.items():
+                line = json.dumps({"q": question, "a": answer}, ensure_ascii=False).encode("utf-8") + b"\n"
+                digest.update(line)
+                raw_size += len(line)
+                f.write(line)
+        return digest.hexdigest(), raw_size
+
+    @staticmethod
+    def _write_bundle(path, open_codec, bundle_path):
+        # manifest.json en dernier : à l'extraction, une version n'est complète qu'avec lui
+        names = sorted(name for name in os.listdir(bundle_path) if name != "manifest.json") + ["manifest.json"]
+        with open_codec(path, "wb") as raw, tarfile.open(fileobj=raw, mode="w|") as tar:
+            for name in names:
+                tar.add(os.path.join(bundle_path, name), arcname=name)
+
+    def save(self, qa_pairs, codec="zlib", note="", bundle=None, make_current=True):
+        """Compress ``qa_pairs`` (and ``bundle``'s files) into a new version.
+
+        ``bundle`` must hold exactly ``qa_pairs`` (see :func:`matching_bundle`).
+        The new version becomes current unless ``make_current`` is false.
+        Saving content identical to the current version only returns it.
+        """
+        extension, open_codec = CODECS[codec]
+        os.makedirs(self.directory, exist_ok=True)
+        with file_lock(self.manifest_path):
+            manifest = self.manifest()
+            tmp = os.path.join(self.directory, f".snapshot-{os.getpid()}")
+            tmp_pairs, tmp_bundle = f"{tmp}.jsonl{extension}", f"{tmp}.tar{extension}"
+            try:
+                sha256, raw_size = self._write_pairs(tmp_pairs, open_codec, qa_pairs)
+                current = next((v for v in manifest["versions"] if v["version"] == manifest["current"]), None)
+                bundle_version = bundle.version if bundle is not None else None
+                if (
+                    current is not None
+                    and current["sha256"] == sha256
+                    and (current.get("bundle") or {}).get("version") == bundle_version
+                ):
+                    return current
+                version = f"{time.strftime('%Y%m%d-%H%M%S')}-{sha256[:8]}"
+                name = f"qa-{version}.jsonl{extension}"
+                bundle_entry = None
+                if bundle is not None:
+                    self._write_bundle(tmp_bundle, open_codec, bundle.path)
+                    bundle_entry = {
+                        "version": bundle_version,
+                        "file": f"qa-{version}.bundle.tar{extension}",
+                        "sha256": content_hash(tmp_bundle),
+                        "size": os.path.getsize(tmp_bundle),
+                    }
+                    os.replace(tmp_bundle, os.path.join(self.directory, bundle_entry["file"]))
+                os.replace(tmp_pairs, os.path.join(self.directory, name))
+            finally:
+                for path in (tmp_pairs, tmp_bundle):
+                    if os.path.exists(path):
+                        os.remove(path)
+            entry = {
+                "version": version,
+                "file": name,
+                "codec": codec,
+                "count": len(qa_pairs),
+                "sha256": sha256,
+                "raw_size": raw_size,
+                "size": os.path.getsize(os.path.join(self.directory, name)),
+                "bundle": bundle_entry,
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "parent": manifest["current"],
+                "note": note,
+            }
+            manifest["versions"].append(entry)
+            if make_current:
+                manifest["current"] = version
+            self._write_manifest(manifest)
+        return entry
+
+    # === Lecture ===
+
+    def iter_pairs(self, version=None):
+        """Stream the ``(question, answer)`` pairs of ``version`` (default: current).
+
+        The checksum is verified once the stream is exhausted.
+        """
+        entry = self.entry(version)
+        _, open_codec = CODECS[entry["codec"]]
+        digest = hashlib.sha256()
+        with open_codec(os.path.join(self.directory, entry["file"]), "rb") as raw:
+            stream = raw if isinstance(raw, io.BufferedIOBase) else io.BufferedReader(raw)
+            for line in stream:
+                digest.update(line)
+                item = json.loads(line)
+                yield item["q"], item["a"]
+        if digest.hexdigest() != entry["sha256"]:
+            raise ValueError(f"snapshot {entry['version']} is corrupt (checksum mismatch)")
+
+    def load(self, version=None):
+        """Decode ``version`` into an ordered dict of pairs."""
+        return dict(self.iter_pairs(version))
+
+    def bundle_file(self, version=None):
+        """Verified path of the bundle archive of ``version``, or ``None`` if it has none."""
+        entry = self.entry(version)
+        bundle = entry.get("bundle")
+        if bundle is None:
+            return None
+        path = os.path.join(self.directory, bundle["file"])
+        if content_hash(path) != bundle["sha256"]:
+            raise ValueError(f"bundle of snapshot {entry['version']} is corrupt (checksum mismatch)")
+        return path
+
+    def extract_bundle(self, version, bundle_dir="qa_bundle"):
+        """Stream the bundle files of ``version`` into ``bundle_dir`` and make it current.
+
+        Returns the bundle version, or ``None`` if the snapshot has no bundle.
+        """
+        entry = self.entry(version)
+        path = self.bundle_file(entry["version"])
+        if path is None:
+            return None
+        bundle = entry["bundle"]
+        target = os.path.join(bundle_dir, bundle["version"])
+        os.makedirs(target, exist_ok=True)
+        _, open_codec = CODECS[entry["codec"]]
+        with open_codec(path, "rb") as raw, tarfile.open(fileobj=raw, mode="r|") as tar:
+            for member in tar:
+                if not member.isfile() or os.path.basename(member.name) != member.name:
+                    raise ValueError(f"unexpected member {member.name!r} in {path}")
+                source = tar.extractfile(member)
+                atomic_write(os.path.join(target, member.name), lambda f: shutil.copyfileobj(source, f))
+        # CURRENT en dernier, comme à la compilation
+        atomic_write(os.path.join(bundle_dir, CURRENT), lambda f: f.write(bundle["version"] + "\n"), mode="w")
+        return bundle["version"]
+
+
+def restore(snapshots, path="qa_data.json", version=None, bundle_dir="qa_bundle"):
+    """Rewrite the knowledge base ``path`` (and its bundle) from a snapshot.
+
+    The current state, journal included, is snapshotted first so nothing
+    learned since the last save is lost. The manifest points at ``version``
+    only once everything is restored. Returns the restored pairs.
+    """
+    entry = snapshots.entry(version)
+    # Sommes de contrôle vérifiées avant toute écriture
+    qa_pairs = snapshots.load(entry["version"])
+    snapshots.bundle_file(entry["version"])
+    model = model_name = None
+    if entry.get("bundle") is None and os.path.isdir(bundle_dir):
+        current = load_bundle(bundle_dir, embeddings=False)
+        if current is not None and current.model:
+            # Recompiler sans modèle perdrait la matrice d'embeddings : on le charge avant d'écrire.
+            from .semantic import load_model
+
+            model, model_name = load_model(current.model), current.model
+    store = KnowledgeStore(path)
+    with file_lock(path):
+        snapshots.save(
+            store.load(),
+            entry["codec"],
+            f"avant retour à {entry['version']}",
+            matching_bundle(store, bundle_dir),
+            make_current=False,
+        )
+        write_json_atomic(path, qa_pairs)
+        if os.path.exists(store.journal_path):
+            os.remove(store.journal_path)
+    if entry.get("bundle") is not None:
+        snapshots.extract_bundle(entry["version"], bundle_dir)
+    elif os.path.isdir(bundle_dir):
+        compile_bundle(
+            qa_pairs,
+            bundle_dir,
+            content_hash(path, store.journal_path),
+            model,
+            model_name,
+            aliases=load_aliases(os.path.join(os.path.dirname(path), "qa_aliases.json")),
+            base_hash=content_hash(path),
+        )
+    snapshots.set_current(entry["version"])
+    return qa_pairs
+
+
+def rollback(snapshots, steps=1, path="qa_data.json", bundle_dir="qa_bundle"):
+    """Restore the ``steps``-th ancestor of the current version; return its entry."""
+    entry = snapshots.ancestor(steps)
+    restore(snapshots, path, entry["version"], bundle_dir)
+    return entry
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compressed DropBot knowledge-base snapshots")
+    parser.add_argument("--dir", default="qa_snapshots")
+    parser.add_argument("--path", default="qa_data.json")
+    parser.add_argument("--bundle", default="qa_bundle")
+    commands = parser.add_subparsers(dest="command", required=True)
+    save = commands.add_parser("save", help="snapshot the knowledge base (base file + journal)")
+    save.add_argument("--codec", choices=sorted(CODECS), default="zlib")
+    save.add_argument("--note", default="")
+    commands.add_parser("list", help="list the versions")
+    back = commands.add_parser("rollback", help="restore an earlier version")
+    back.add_argument("--steps", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    snapshots = SnapshotStore(args.dir)
+    if args.command == "save":
+        store = KnowledgeStore(args.path)
+        entry = snapshots.save(store.load(), args.codec, args.note, matching_bundle(store, args.bundle))
+        bundle = f" + bundle {entry['bundle']['size'] / 1024:.0f} Kio" if entry.get("bundle") else ""
+        print(
+            f"✅ {entry['version']} : {entry['count']} paires, "
+            f"{entry['raw_size'] / 1024:.0f} Kio → {entry['size'] / 1024:.0f} Kio{bundle} ({entry['codec']})"
+        )
+    elif args.command == "list":
+        current = snapshots.manifest()["current"]
+        for entry in snapshots.versions():
+            mark = "*" if entry["version"] == current else " "
+            bundle = "bundle" if entry.get("bundle") else "      "
+            print(
+                f"{mark} {entry['version']}  {entry['count']:>6} paires  "
+                f"{entry['size'] / 1024:>7.0f} Kio  {entry['codec']:<4}  {bundle}  {entry['note']}"
+            )
+    else:
+        entry = rollback(snapshots, args.steps, args.path, args.bundle)
+        print(f"✅ {args.path} restauré depuis {entry['version']} ({entry['count']} paires)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""SQLite + FTS5 knowledge base for DropBot.
+
+Q/A pairs live in ``qa`` and their normalized questions in the FTS5 table
+``qa_fts`` (kept in sync by triggers). Candidate retrieval is a BM25-ranked
+``MATCH`` run inside SQLite; only the top candidates reach the fuzzy scorer.
+The database runs in WAL mode so sessions keep reading while one learns.
+
+Import an existing JSON knowledge base (base file + journal) with::
+
+    python -m dropbot.sqlite_store migrate qa_data.json qa_data.db
+"""
+import argparse
+import heapq
+import sqlite3
+import threading
+
+from .matcher import fuzzy_score
+from .normalize import normalize_text
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS qa (
+    id INTEGER PRIMARY KEY,
+    question TEXT NOT NULL UNIQUE,
+    norm TEXT NOT NULL,
+    answer TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS qa_norm ON qa(norm);
+CREATE VIRTUAL TABLE IF NOT EXISTS qa_fts USING fts5(
+    norm, content='qa', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS qa_ai AFTER INSERT ON qa BEGIN
+    INSERT INTO qa_fts(rowid, norm) VALUES (new.id, new.norm);
+END;
+CREATE TRIGGER IF NOT EXISTS qa_ad AFTER DELETE ON qa BEGIN
+    INSERT INTO qa_fts(qa_fts, rowid, norm) VALUES ('delete', old.id, old.norm);
+END;
+CREATE TRIGGER IF NOT EXISTS qa_au AFTER UPDATE OF norm ON qa BEGIN
+    INSERT INTO qa_fts(qa_fts, rowid, norm) VALUES ('delete', old.id, old.norm);
+    INSERT INTO qa_fts(rowid, norm) VALUES (new.id, new.norm);
+END;
+"""
+
+
+def fts_query(text):
+    """OR of the quoted tokens of ``text`` (quoting disables FTS5 operators)."""
+    tokens = dict.fromkeys(normalize_text(text).split())
+    return " OR ".join(f'"{token}"' for token in tokens)
+
+
+class SqliteStore:
+    """Knowledge base and match backend backed by one SQLite file."""
+
+    threshold = 80
+    confident = 100
+
+    def __init__(self, path="qa_data.db", candidates=20):
+        self.path = path
+        self.candidates = candidates
+        self._local = threading.local()
+        with self._connection() as db:
+            db.executescript(SCHEMA)
+
+    def _connection(self):
+        # Une connexion par thread : sqlite3 ne partage pas ses connexions.
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def __len__(self):
+        return self._connection().execute("SELECT count(*) FROM qa").fetchone()[0]
+
+    # === Stockage ===
+
+    def get(self, question):
+        """Stored answer for ``question`` or ``None``."""
+        row = self._connection().execute(
+            "SELECT answer FROM qa WHERE question = ?", (question,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def items(self):
+        """All ``(question, answer)`` pairs in insertion order."""
+        return self._connection().execute("SELECT question, answer FROM qa ORDER BY id").fetchall()
+
+    def learn(self, question, answer):
+        """Insert or update one pair (indexed by the FTS triggers)."""
+        with self._connection() as db:
+            db.execute(
+                "INSERT INTO qa(question, norm, answer) VALUES (?, ?, ?) "
+                "ON CONFLICT(question) DO UPDATE SET answer = excluded.answer",
+                (question, normalize_text(question), answer),
+            )
+
+    def import_pairs(self, qa_pairs):
+        """Bulk insert ``qa_pairs`` in one transaction; return the row count."""
+        rows = [(q, normalize_text(q), a) for q, a in qa_pairs.items()]
+        with self._connection() as db:
+            db.executemany(
+                "INSERT INTO qa(question, norm, answer) VALUES (?, ?, ?) "
+                "ON CONFLICT(question) DO UPDATE SET answer = excluded.answer",
+                rows,
+            )
+        return len(rows)
+
+    def add(self, key):
+        """Rows are indexed by the triggers when :meth:`learn` inserts them."""
+        return False
+
+    def sync(self):
+        pass
+
+    # === Recherche ===
+
+    def lookup(self, query):
+        """Return the stored key equal to ``query`` (exactly or once normalized)."""
+        db = self._connection()
+        row = db.execute("SELECT question FROM qa WHERE question = ?", (query,)).fetchone()
+        if row is None:
+            row = db.execute(
+                "SELECT question FROM qa WHERE norm = ? ORDER BY id LIMIT 1",
+                (normalize_text(query),),
+            ).fetchone()
+        return row[0] if row else None
+
+    def candidates_for(self, query, limit=None):
+        """BM25-ranked ``(question, norm)`` candidates for ``query``."""
+        match = fts_query(query)
+        if not match:
+            return []
+        return self._connection().execute(
+            "SELECT qa.question, qa.norm FROM qa_fts JOIN qa ON qa.id = qa_fts.rowid "
+            "WHERE qa_fts MATCH ? ORDER BY bm25(qa_fts) LIMIT ?",
+            (match, limit or self.candidates),
+        ).fetchall()
+
+    def top_k(self, query, k=5):
+        """Fuzzy-score the FTS candidates and return the best ``k``."""
+        norm_query = normalize_text(query)
+        # À score égal, le rang BM25 départage les candidats.
+        scored = (
+            (fuzzy_score(norm_query, norm), -rank, question)
+            for rank, (question, norm) in enumerate(self.candidates_for(query))
+        )
+        return [(question, score) for score, _, question in heapq.nlargest(k, scored)]
+
+    def rerank(self, query, keys):
+        """Score ``query`` against ``keys`` only, best first."""
+        norm_query = normalize_text(query)
+        scored = [(key, fuzzy_score(norm_query, normalize_text(key))) for key in keys]
+        scored.sort(key=lambda pair: pair[1], reverse=True)
+        return scored
+
+    def search(self, query):
+        """Return the best ``(key, score)`` for ``query``."""
+        best = self.top_k(query, 1)
+        return best[0] if best else (None, 0)
+
+    def find_k(self, query, k=5):
+        """Up to ``k`` ``(key, score)`` candidates, best first; a hash hit is alone."""
+        key = self.lookup(query)
+        if key is not None:
+            return [(key, 100)]
+        return self.top_k(query, k)
+
+    def find(self, query):
+        """Best ``(key, score)`` for ``query``; hash hits score 100."""
+        key = self.lookup(query)
+        if key is not None:
+            return key, 100
+        return self.search(query)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="DropBot SQLite knowledge base")
+    commands = parser.add_subparsers(dest="command", required=True)
+    migrate = commands.add_parser("migrate", help="import a JSON knowledge base (and its journal)")
+    migrate.add_argument("source", nargs="?", default="qa_data.json")
+    migrate.add_argument("target", nargs="?", default="qa_data.db")
+    args = parser.parse_args(argv)
+
+    if args.command == "migrate":
+        from .store import KnowledgeStore
+
+        count = SqliteStore(args.target).import_pairs(KnowledgeStore(args.source).load())
+        print(f"✅ {count} paires importées dans {args.target}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Knowledge-base storage for DropBot.
+
+``qa_data.json`` stays the base file; answers learned at runtime are appended
+to ``qa_data.journal.jsonl`` (one JSON object per line) and replayed on top of
+the base when loading. Appending is O(1) and fsync'ed; a torn last line left
+by a crash is skipped on replay. ``compact`` folds the journal back into the
+base file.
+
+Writers (``learn``, ``compact``) serialize on ``qa_data.json.lock``. Readers
+take no lock: the base file is only ever replaced by an atomic rename and the
+journal is opened before the base, so a concurrent compaction is seen either
+entirely or not at all::
+
+    python -m dropbot.store compact qa_data.json
+"""
+import argparse
+import json
+import os
+import time
+
+from .fileio import atomic_write, file_lock
+
+
+def journal_path_for(path):
+    """Default journal path that belongs to the base file ``path``."""
+    return os.path.splitext(path)[0] + ".journal.jsonl"
+
+
+def write_json_atomic(path, data):
+    """Replace ``path`` with ``data`` through a temporary file and a rename."""
+    atomic_write(path, lambda f: json.dump(data, f, ensure_ascii=False, indent=4), mode="w")
+
+
+class KnowledgeStore:
+    """Base JSON file plus an append-only journal of learned pairs."""
+
+    def __init__(self, path="qa_data.json", journal_path=None, snapshots=None):
+        self.path = path
+        self.journal_path = journal_path or journal_path_for(path)
+        # Base de secours quand ``path`` manque (image qui ne livre que les
+        # instantanés compressés, voir dropbot.snapshot).
+        self.snapshots = snapshots
+
+    def load_base(self):
+        if not os.path.exists(self.path):
+            if self.snapshots is not None and self.snapshots.current() is not None:
+                return self.snapshots.load()
+            return {}
+        with open(self.path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _open_journal(self):
+        try:
+            return open(self.journal_path, "r", encoding="utf-8")
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _parse(journal):
+        for line in journal:
+            try:
+                entry = json.loads(line)
+            except ValueError:  # ligne tronquée par un arrêt brutal
+                continue
+            yield entry["q"], entry["a"]
+
+    def replay(self):
+        """Yield the ``(question, answer)`` pairs recorded in the journal."""
+        journal = self._open_journal()
+        if journal is None:
+            return
+        with journal:
+            yield from self._parse(journal)
+
+    def load(self):
+        """Base pairs with the journal applied on top, in insertion order."""
+        # Journal ouvert AVANT la lecture de la base : si une compaction a lieu
+        # entre les deux, on rejoue l'ancien journal sur la nouvelle base, ce
+        # qui donne le même contenu.
+        journal = self._open_journal()
+        data = self.load_base()
+        if journal is not None:
+            with journal:
+                for question, answer in self._parse(journal):
+                    data[question] = answer
+        return data
+
+    def learn(self, question, answer):
+        """Durably append one learned pair to the journal."""
+        line = json.dumps({"q": question, "a": answer, "ts": time.time()}, ensure_ascii=False)
+        with file_lock(self.path), open(self.journal_path, "a+b") as f:
+            # Si le dernier ajout a été interrompu, on termine sa ligne pour
+            # ne pas coller la nouvelle entrée à un fragment illisible.
+            if f.tell() > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    f.write(b"\n")
+            f.write(line.encode("utf-8") + b"\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def compact(self):
+        """Fold the journal into the base file; return the number of entries folded."""
+        with file_lock(self.path):
+            folded = sum(1 for _ in self.replay())
+            if not folded:
+                return 0
+            write_json_atomic(self.path, self.load())
+            # Un arrêt ici ne perd rien : rejouer le journal sur la nouvelle
+            # base redonne le même contenu.
+            os.remove(self.journal_path)
+        return folded
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="DropBot knowledge-base maintenance")
+    commands = parser.add_subparsers(dest="command", required=True)
+    compact = commands.add_parser("compact", help="fold the journal into the base file")
+    compact.add_argument("path", nargs="?", default="qa_data.json")
+    args = parser.parse_args(argv)
+
+    if args.command == "compact":
+        folded = KnowledgeStore(args.path).compact()
+        print(f"✅ {folded} entrée(s) du journal intégrée(s) dans {args.path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,3 @@
-import json
-
 # Replace this with your full qa_pairs dictionary
 qa_pairs = {
         "Qu’est-ce que l’eau ?": "L’eau est une substance composée de deux atomes d’hydrogène et un atome d’oxygène (H₂O). C’est un liquide transparent, inodore et sans goût à température ambiante.",
@@ -216,8 +214,9 @@ qa_pairs = {
         "Qui êtes-vous ?": "Je suis DropBot, un chatbot conçu spécifiquement pour répondre à vos questions concernant l'eau. Je fais partie de l'application **Watersense**, un projet innovant développé par l' **equipe fikr Ibn Batouta**. Mon objectif est de vous fournir des informations précises et fiables sur l'eau, sa gestion, sa conservation, et bien plus encore. Grâce à mes réponses, j'espère vous aider à mieux comprendre l'importance de l'eau et comment en prendre soin pour préserver cette ressource vitale. N'hésitez pas à me poser toutes vos questions liées à l'eau, je suis là pour vous assister !"
 }
 
-# Save the dictionary to a JSON file
-with open("qa_data.json", "w", encoding="utf-8") as f:
-    json.dump(qa_pairs, f, ensure_ascii=False, indent=2)
+# Build step: merge these pairs into qa_data.json and compile the DropBot bundle
+# (python questions.py [--embeddings], see dropbot/bundle.py)
+if __name__ == "__main__":
+    from dropbot.bundle import main
 
-print("✅ Fichier JSON sauvegardé avec succès dans qa_data.json")
+    main(seed=qa_pairs)
@@ -4,13 +4,31 @@ import pandas as pd
 import os
 import matplotlib.pyplot as plt
 import time
-import json
 import random
-from fuzzywuzzy import process
 from fuzzywuzzy import fuzz
 from datetime import datetime
+from collections import ChainMap
 from streamlit_chat import message
 import base64
+import itertools
+
+from dropbot import Cascade, MatcherIndex, SemanticIndex, normalize_text
+from dropbot.artifacts import content_hash, load_or_build_embeddings
+from dropbot.batching import BatchEncoder
+from dropbot.bundle import load_bundle
+from dropbot.cache import AnswerCache
+from dropbot.crosslingual import CrossLingualRouter, calibrate
+from dropbot.dedupe import filter_aliases, load_aliases
+from dropbot.intents import SmallTalkModel, SmallTalkRouter
+from dropbot.lexical import TfidfIndex
+from dropbot.misses import MissLog
+from dropbot.offload import DeadlineRouter, LazyResource, MatchPool, WarmupRouter
+from dropbot.pages import load_page_index
+from dropbot.passages import PassageIndex
+from dropbot.semantic import DEFAULT_MODEL, load_model
+from dropbot.snapshot import SnapshotStore
+from dropbot.sqlite_store import SqliteStore
+from dropbot.store import KnowledgeStore
 
 
 # ---- Personnalisation CSS ----
@@ -1595,7 +1613,7 @@ elif choice== translate("Quiz","اختبار"):
             user_answer = st.text_input(f"{translate('Question', 'سؤال')} {i + 1}: {q['question']}", key=f"pq_{i}")
 
             if user_answer.strip():
-                similarity = fuzz.ratio(user_answer.strip().lower(), q["answer"].lower())
+                similarity = fuzz.ratio(normalize_text(user_answer), normalize_text(q["answer"]))
                 correct = similarity >= 80  # نعتبر الإجابة صحيحة إذا كانت نسبة التشابه 80% أو أكثر
             else:
                 correct = False
@@ -1668,29 +1686,222 @@ elif choice== translate("Quiz","اختبار"):
 # ---- Chatbot ----
 elif choice == translate("Dropbot", "دروب بوت"):
 
-    @st.cache_data
+    # "cascade", "fuzzy" (fuzzywuzzy), "tfidf" (n-grammes scikit-learn), "semantic" (sentence-transformers)
+    # ou "sqlite" (base SQLite + FTS5, voir python -m dropbot.sqlite_store migrate)
+    DROPBOT_BACKEND = os.environ.get("DROPBOT_BACKEND", "cascade")
+    # re-classement de la cascade : "fuzzy" ou "semantic"
+    DROPBOT_RERANKER = os.environ.get("DROPBOT_RERANKER", "fuzzy")
+    # les questions en arabe passent par l'index multilingue (clés françaises)
+    DROPBOT_CROSSLINGUAL = os.environ.get("DROPBOT_CROSSLINGUAL", "1") == "1"
+    # au-delà de ce nombre de clés, la recherche sémantique passe par l'index IVF approché
+    DROPBOT_ANN_MIN_KEYS = int(os.environ.get("DROPBOT_ANN_MIN_KEYS", 100_000))
+    DROPBOT_ANN_NPROBE = int(os.environ.get("DROPBOT_ANN_NPROBE", 8))
+    # "" (float32), "int8" (4x moins de mémoire) ou "binary" (32x, re-notation en float32)
+    DROPBOT_QUANTIZATION = os.environ.get("DROPBOT_QUANTIZATION", "")
+    # attente max (ms) pour regrouper les questions simultanées en un seul passage du modèle
+    DROPBOT_BATCH_WAIT_MS = float(os.environ.get("DROPBOT_BATCH_WAIT_MS", 5))
+    # délai max (s) de la recherche hors du fil du script, puis repli sur TF-IDF
+    DROPBOT_MATCH_TIMEOUT = float(os.environ.get("DROPBOT_MATCH_TIMEOUT", 2.0))
+    DROPBOT_MATCH_WORKERS = int(os.environ.get("DROPBOT_MATCH_WORKERS", 4))
+    # questions sans réponse, regroupées hors ligne par python -m dropbot.misses report ("" : désactivé)
+    DROPBOT_MISS_LOG = os.environ.get("DROPBOT_MISS_LOG", "qa_misses.jsonl")
+
+    # qa_data.json + journal des réponses apprises (qa_data.journal.jsonl) ;
+    # sans qa_data.json, l'instantané courant de qa_snapshots (python -m dropbot.snapshot)
+    knowledge_store = KnowledgeStore("qa_data.json", snapshots=SnapshotStore("qa_snapshots"))
+
+    @st.cache_resource
+    def load_kb_bundle():
+        # حزمة مُجمَّعة مسبقًا (python questions.py) : مفاتيح مُطبَّعة وفهرس TF-IDF وإجابات عند الطلب
+        bundle = load_bundle("qa_bundle")
+        if bundle is None or DROPBOT_BACKEND == "sqlite":
+            return None
+        # qa_data.json تغيّر منذ التجميع (دمج السجل، تعديل يدوي) : نعيد البناء بدلها
+        return bundle if bundle.manifest.get("base_hash") == content_hash(knowledge_store.path) else None
+
+    @st.cache_resource
     def load_qa_data():
-        if os.path.exists("qa_data.json"):
-            with open("qa_data.json", "r", encoding="utf-8") as f:
-                return json.load(f)
-        else:
-            return {}
+        bundle = load_kb_bundle()
+        if bundle is not None and bundle.answers is not None:
+            # المفاتيح فقط في الذاكرة : الإجابات تُقرأ من answers.bin عبر mmap، والسجل فوقها
+            return ChainMap(dict(knowledge_store.replay()), bundle.answers)
+        return knowledge_store.load()
+
+    @st.cache_resource
+    def load_sqlite_store():
+        return SqliteStore(os.environ.get("DROPBOT_DB", "qa_data.db"))
+
+    def get_answer(question):
+        if DROPBOT_BACKEND == "sqlite":
+            return load_sqlite_store().get(question)
+        return load_qa_data().get(question)
+
+    @st.cache_resource
+    def get_answer_cache():
+        # ذاكرة مشتركة بين كل الجلسات : سؤال مُطبَّع → (السؤال المطابق، النسبة، الإجابة)
+        return AnswerCache(
+            capacity=int(os.environ.get("DROPBOT_CACHE_SIZE", 1024)),
+            ttl=float(os.environ.get("DROPBOT_CACHE_TTL", 3600)),
+        )
 
-    def save_qa_data(data):
-        with open("qa_data.json", "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=4)
+    def save_qa_data(question, answer):
+        # لا نُبطل الذاكرة إلا إذا أُضيف المدخل أو تغيّر
+        if get_answer(question) == answer:
+            return
+        if DROPBOT_BACKEND == "sqlite":
+            load_sqlite_store().learn(question, answer)
+        else:
+            knowledge_store.learn(question, answer)  # إضافة سطر واحد إلى السجل
+            load_qa_data.clear()
+        load_passage_index().add(question, answer)
+        get_answer_cache().invalidate(question)
+
+    @st.cache_resource
+    def load_matcher_index():
+        # يُبنى الفهرس مرة واحدة لكل عملية ويُشارك بين الجلسات
+        bundle = load_kb_bundle()
+        if bundle is not None:
+            return bundle.matcher(load_qa_data())  # المفاتيح المتعلَّمة بعد التجميع تُضاف في النهاية
+        # les quasi-doublons (python -m dropbot.dedupe) ne sont trouvés que par hachage
+        qa_pairs = load_qa_data()
+        return MatcherIndex(qa_pairs, aliases=filter_aliases(load_aliases("qa_aliases.json"), qa_pairs))
+
+    def build_semantic_index(matcher, bundle):
+        # يُبنى في خيط من مجموعة البحث عند أول سؤال يحتاجه : تحميل النموذج لا يُجمِّد الصفحة
+        model = load_model()
+        # مصفوفة التضمينات محفوظة بجانب qa_data.json ومقروءة عبر mmap
+        if bundle is not None and bundle.embeddings is not None and bundle.model == DEFAULT_MODEL:
+            embeddings = bundle.embeddings  # les clés apprises depuis sont encodées par sync()
+        else:
+            # clés de qa_data.json seulement : celles du journal sont encodées par sync()
+            base = knowledge_store.load_base()
+            base_keys = list(itertools.takewhile(base.__contains__, matcher.keys))
+            embeddings = load_or_build_embeddings(knowledge_store.path, base_keys, model, DEFAULT_MODEL)
+        # خيط واحد يجمع أسئلة كل الجلسات ويُرمِّزها دفعة واحدة
+        encoder = BatchEncoder(model, max_wait=DROPBOT_BATCH_WAIT_MS / 1000)
+        index = SemanticIndex(matcher, encoder, embeddings, quantization=DROPBOT_QUANTIZATION or None)
+        if len(matcher) >= DROPBOT_ANN_MIN_KEYS:
+            index.enable_ann(nprobe=DROPBOT_ANN_NPROBE)
+        return index
+
+    def build_semantic_cascade(matcher, prefilter, semantic):
+        reranker = semantic.get()
+        if reranker is None:
+            raise RuntimeError("semantic index unavailable")
+        return Cascade(matcher, prefilter, reranker, confident=reranker.confident)
+
+    @st.cache_resource
+    def load_semantic_index():
+        # مورد كسول واحد لكل عملية : لا يُحمَّل شيء أثناء عرض الصفحة
+        matcher, bundle = load_matcher_index(), load_kb_bundle()
+        return LazyResource(lambda: build_semantic_index(matcher, bundle))
+
+    @st.cache_resource
+    def load_tfidf_index():
+        bundle = load_kb_bundle()
+        return TfidfIndex(load_matcher_index(), state=bundle.tfidf if bundle is not None else None)
+
+    @st.cache_resource
+    def load_cascade(reranker_name):
+        # exact → normalisé → pré-filtre TF-IDF → re-classement des k candidats
+        matcher = load_matcher_index()
+        if reranker_name == "semantic":
+            # TF-IDF répond, sur l'échelle de la cascade, tant que le modèle se charge
+            semantic, prefilter = load_semantic_index(), load_tfidf_index()
+            cascade = LazyResource(lambda: build_semantic_cascade(matcher, prefilter, semantic))
+            return WarmupRouter(cascade, prefilter, SemanticIndex.threshold, SemanticIndex.confident)
+        return Cascade(matcher, load_tfidf_index(), matcher, confident=matcher.confident)
+
+    @st.cache_resource
+    def load_smalltalk_model():
+        # مصنف التحيات والشكر : يُدرَّب مرة واحدة من مفاتيح القاعدة المستعملة فعلًا
+        if DROPBOT_BACKEND == "sqlite":
+            return SmallTalkModel(key for key, _ in load_sqlite_store().items())
+        return SmallTalkModel(load_qa_data().keys())
+
+    @st.cache_resource
+    def load_passage_index():
+        # مقاطع من نصوص الإجابات : احتياط عندما لا يطابق أي مفتاح
+        if DROPBOT_BACKEND == "sqlite":
+            return PassageIndex(dict(load_sqlite_store().items()))
+        bundle = load_kb_bundle()
+        if bundle is not None and bundle.passages is not None:
+            # فهرس مُجمَّع ومُسقَط في الذاكرة ؛ الإجابات المتعلَّمة بعد التجميع تُضاف فوقه
+            index = bundle.passages
+            for key, answer in knowledge_store.replay():
+                index.add(key, answer)
+            return index
+        return PassageIndex(load_qa_data())
+
+    @st.cache_resource
+    def load_pages_index():
+        # نصوص صفحات التطبيق (python -m dropbot.pages extract) : مصدر ثانوي
+        return load_page_index("page_passages.json", source="test.py")
+
+    @st.cache_resource
+    def load_match_pool():
+        # مجموعة خيوط محدودة مشتركة : البحث لا يُجمِّد خيط الصفحة
+        return MatchPool(max_workers=DROPBOT_MATCH_WORKERS)
+
+    @st.cache_resource
+    def load_miss_log():
+        # سجل دوّار للأسئلة بلا إجابة : يكشف الثغرات الأكثر تكرارًا في القاعدة
+        return MissLog(DROPBOT_MISS_LOG) if DROPBOT_MISS_LOG else None
 
     # === وظائف المساعدة ===
 
-    def find_best_match(user_input, qa_pairs):
-        best_match = process.extractOne(user_input, qa_pairs.keys())
-        if best_match and best_match[1] > 80:
-            return best_match[0], best_match[1]  # إرجاع السؤال الأكثر توافقًا والنسبة المئوية للتطابق
-        return None, 0
+    def find_best_match(user_input, index, k=4):
+        # تمريرة واحدة تُرجع أفضل k مرشحين : الأول هو الجواب والبقية اقتراحات
+        # degraded : انتهت المهلة وجاءت النتيجة من المطابق المعجمي الاحتياطي
+        candidates, degraded = index.find_k_timed(user_input, k)
+        suggestions = [key for key, score in candidates if score > index.threshold - 20]
+        if candidates and candidates[0][1] > index.threshold:
+            best_match, score = candidates[0]
+            return best_match, score, suggestions[1:], degraded  # إرجاع السؤال الأكثر توافقًا والنسبة المئوية للتطابق
+        return None, 0, suggestions, degraded
+
+    def find_passage(index, user_input):
+        # أفضل مقطع بنسبة على سلّم المطابق الرئيسي، لتُقارن مباشرة بنسبة أفضل مفتاح
+        key, passage, score = index.find(user_input)
+        if score < index.threshold:
+            return None, None, 0
+        scales = (index.threshold, index.confident), (matcher_index.threshold, matcher_index.confident)
+        return key, passage, calibrate(score, *scales)
+
+    def answer_suggestion(question):
+        # الاقتراح يُحل مباشرة إلى الإجابة المخزنة دون إعادة البحث
+        st.session_state.history.append(("Toi", question))
+        st.session_state.history.append(("Bot", f"**{get_answer(question)}**"))
+        st.session_state.awaiting_answer = False
+        st.session_state.pending_question = ""
+        st.session_state.suggestions = []
 
     # === تحميل البيانات ===
 
-    qa_pairs = load_qa_data()
+    if DROPBOT_BACKEND == "sqlite":
+        matcher_index = load_sqlite_store()
+    elif DROPBOT_BACKEND == "semantic":
+        # TF-IDF répond tant que le modèle se charge
+        matcher_index = WarmupRouter(
+            load_semantic_index(), load_tfidf_index(), SemanticIndex.threshold, SemanticIndex.confident
+        )
+    elif DROPBOT_BACKEND == "tfidf":
+        matcher_index = load_tfidf_index()
+    elif DROPBOT_BACKEND == "fuzzy":
+        matcher_index = load_matcher_index()
+    else:
+        matcher_index = load_cascade(DROPBOT_RERANKER)
+
+    if DROPBOT_CROSSLINGUAL and DROPBOT_BACKEND not in ("semantic", "sqlite"):
+        # le modèle n'est chargé qu'à la première question en arabe, dans un fil de la MatchPool
+        matcher_index = CrossLingualRouter(matcher_index, load_semantic_index())
+
+    # التحيات والشكر والوداع تُجاب قبل البحث في كامل القاعدة
+    matcher_index = SmallTalkRouter(matcher_index, load_smalltalk_model())
+
+    # بعد المهلة : TF-IDF (أو لا شيء مع SQLite) بدل انتظار المطابق البطيء
+    fallback_index = None if DROPBOT_BACKEND == "sqlite" else load_tfidf_index()
+    matcher_index = DeadlineRouter(matcher_index, fallback_index, load_match_pool(), DROPBOT_MATCH_TIMEOUT)
 
     # === تهيئة الذاكرة ===
 
@@ -1703,6 +1914,9 @@ elif choice == translate("Dropbot", "دروب بوت"):
     if "pending_question" not in st.session_state:
         st.session_state.pending_question = ""
 
+    if "suggestions" not in st.session_state:
+        st.session_state.suggestions = []
+
     # === الواجهة ===
 
     st.title(translate("DropBot 💧", "دروب بوت 💧"))
@@ -1717,26 +1931,59 @@ elif choice == translate("Dropbot", "دروب بوت"):
     # === معالجة السؤال ===
 
     if submitted and user_input:
-        match, match_score = find_best_match(user_input, qa_pairs)
+        answer_cache = get_answer_cache()
+        cached = answer_cache.get(user_input)
+        if cached is None:
+            match, match_score, suggestions, degraded = find_best_match(user_input, matcher_index)
+            answer = get_answer(match) if match else None
+            if match_score < matcher_index.confident:
+                # مطابقة غير مؤكدة : قد يغطي مقطع من نصوص الإجابات السؤال أفضل من المفتاح
+                key, passage, passage_score = find_passage(load_passage_index(), user_input)
+                if passage_score > match_score:
+                    match, match_score, answer = key, passage_score, passage
+                if load_pages_index() is not None:
+                    # ثم في نصوص صفحات التطبيق (جودة المياه، إدارة المياه...)
+                    page, passage, passage_score = find_passage(load_pages_index(), user_input)
+                    if passage_score > match_score:
+                        match, match_score, answer = page, passage_score, passage
+            if not degraded:  # لا نحفظ نتيجة الاحتياط : المطابق الكامل قد يجيب أفضل لاحقًا
+                answer_cache.put(user_input, match, match_score, answer, suggestions)
+        else:
+            match, match_score, answer, suggestions = cached
+            degraded = False
+        if match and get_answer(match) is None and load_pages_index() is not None and match in load_pages_index():
+            # مقطع من صفحة : الإحالة تُصاغ بلغة هذه الجلسة ولا تُحفظ في الذاكرة المشتركة
+            answer = f"{answer} ({translate('voir la page', 'انظر صفحة')} « {match} »)"
         st.session_state.history.append(("Toi", user_input))  # سجل السؤال أولاً
         
-        if match and match_score == 100:
-            best_answer = qa_pairs[match]
+        if match and match_score >= matcher_index.confident:
+            best_answer = answer
             bot_response = f"**{best_answer}**"
             st.session_state.history.append(("Bot", bot_response))
             st.session_state.awaiting_answer = False
             st.session_state.pending_question = ""
+            st.session_state.suggestions = []
         else:
             st.session_state.awaiting_answer = True
             st.session_state.pending_question = user_input
+            st.session_state.suggestions = list(suggestions)
+            if load_miss_log() is not None:
+                load_miss_log().record(user_input, match, match_score, degraded)
             # عرض الإجابة مع التطابق جزئيًا
             if match:
-                partial_answer = qa_pairs[match]
+                partial_answer = answer
                 bot_response = f"**إجابة تقريبية :** {partial_answer} (تطابق: {match_score}%)"
             else:
                 bot_response = "**لم أتمكن من إيجاد إجابة دقيقة.**"
             st.session_state.history.append(("Bot", bot_response))
 
+    # === اقتراحات « هل تقصد » ===
+
+    if st.session_state.suggestions:
+        st.markdown(translate("**Voulais-tu dire :**", "**هل تقصد :**"))
+        for i, suggestion in enumerate(st.session_state.suggestions):
+            st.button(suggestion, key=f"suggestion_{i}", on_click=answer_suggestion, args=(suggestion,))
+
     # === إذا البوت ينتظر إجابة من المستخدم ===
 
     if st.session_state.awaiting_answer:
@@ -1747,17 +1994,18 @@ elif choice == translate("Dropbot", "دروب بوت"):
             save_submitted = st.form_submit_button(translate("Sauvegarder la réponse", "حفظ الإجابة"))
 
         if save_submitted and new_answer:
-            qa_pairs = load_qa_data()  # إعادة التحميل لضمان التحديث
-            qa_pairs[st.session_state.pending_question] = new_answer
-            save_qa_data(qa_pairs)
+            # إضافة السؤال مباشرة إلى الفهرس المشترك : يصبح متاحًا لكل الجلسات
+            matcher_index.add(st.session_state.pending_question)
+            save_qa_data(st.session_state.pending_question, new_answer)
             
             bot_response = translate("**Merci ! J'ai appris une nouvelle réponse.**", "**شكراً! لقد تعلمت إجابة جديدة.**")
             st.session_state.history.append(("Bot", bot_response))
             
             st.session_state.awaiting_answer = False
             st.session_state.pending_question = ""
-            st.success(translate("Merci ! J'ai appris une nouvelle réponse. Recharge la page pour continuer.", 
-                                 "شكراً! لقد تعلمت إجابة جديدة. يرجى إعادة تحميل الصفحة للمتابعة."))
+            st.session_state.suggestions = []
+            st.success(translate("Merci ! J'ai appris une nouvelle réponse.", 
+                                 "شكراً! لقد تعلمت إجابة جديدة."))
 
     # === عرض المحادثة مع الأفتارات ===
 
@@ -0,0 +1,172 @@
+"""Journal, compaction and snapshot guarantees of the DropBot knowledge store."""
+import json
+import multiprocessing
+import os
+
+import pytest
+
+from dropbot import snapshot
+from dropbot.artifacts import content_hash
+from dropbot.bundle import compile_bundle, load_bundle
+from dropbot.snapshot import SnapshotStore, matching_bundle, rollback
+from dropbot.store import KnowledgeStore, write_json_atomic
+
+
+BASE = {
+    "Qu'est-ce que le cycle de l'eau ?": "Le cycle de l'eau décrit la circulation de l'eau sur Terre.",
+    "Pourquoi économiser l'eau ?": "Parce que l'eau douce disponible est limitée.",
+}
+
+
+@pytest.fixture
+def store(tmp_path):
+    path = str(tmp_path / "qa_data.json")
+    write_json_atomic(path, BASE)
+    return KnowledgeStore(path)
+
+
+def _learn(path, worker, count):
+    store = KnowledgeStore(path)
+    for i in range(count):
+        store.learn(f"question {worker}-{i} ?", f"réponse {worker}-{i}")
+
+
+def _compact(path, rounds):
+    store = KnowledgeStore(path)
+    for _ in range(rounds):
+        store.compact()
+
+
+def _run(*processes):
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(60)
+        assert process.exitcode == 0
+
+
+# === Journal ===
+
+
+def test_learn_is_replayed_over_the_base(store):
+    store.learn("Qu'est-ce qu'une nappe phréatique ?", "Une réserve d'eau souterraine.")
+    store.learn("Pourquoi économiser l'eau ?", "Pour préserver les nappes.")
+
+    data = KnowledgeStore(store.path).load()
+    assert list(data) == list(BASE) + ["Qu'est-ce qu'une nappe phréatique ?"]
+    assert data["Pourquoi économiser l'eau ?"] == "Pour préserver les nappes."
+    with open(store.path, "r", encoding="utf-8") as f:
+        assert json.load(f) == BASE  # la base n'est pas réécrite
+
+
+def test_torn_journal_line_is_skipped(store):
+    store.learn("avant ?", "A")
+    with open(store.journal_path, "ab") as f:
+        f.write(b'{"q": "coup\xc3\xa9e ?", "a": "inter')  # arrêt brutal au milieu d'un ajout
+    store.learn("après ?", "B")
+
+    assert list(store.replay()) == [("avant ?", "A"), ("après ?", "B")]
+
+
+def test_learn_from_concurrent_processes(store):
+    _run(*(multiprocessing.Process(target=_learn, args=(store.path, worker, 50)) for worker in range(4)))
+
+    with open(store.journal_path, "r", encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    assert len(lines) == 200
+    assert all(json.loads(line)["q"] for line in lines)  # aucune ligne entrelacée
+    assert len(store.load()) == len(BASE) + 200
+
+
+def test_compact_folds_the_journal(store):
+    store.learn("Qu'est-ce qu'une nappe phréatique ?", "Une réserve d'eau souterraine.")
+    expected = store.load()
+
+    assert store.compact() == 1
+    assert not os.path.exists(store.journal_path)
+    with open(store.path, "r", encoding="utf-8") as f:
+        assert json.load(f) == expected
+    assert store.compact() == 0
+
+
+def test_compaction_racing_learners_loses_nothing(store):
+    learners = [multiprocessing.Process(target=_learn, args=(store.path, worker, 40)) for worker in range(3)]
+    _run(*learners, multiprocessing.Process(target=_compact, args=(store.path, 30)))
+
+    data = store.load()
+    assert len(data) == len(BASE) + 120
+    assert all(data[f"question {w}-{i} ?"] == f"réponse {w}-{i}" for w in range(3) for i in range(40))
+    store.compact()
+    assert KnowledgeStore(store.path).load() == data
+
+
+# === Instantanés ===
+
+
+def test_rollback_snapshots_the_journal_first(store, tmp_path):
+    snapshots = SnapshotStore(str(tmp_path / "qa_snapshots"))
+    first = snapshots.save(store.load())
+    store.learn("Qu'est-ce qu'une nappe phréatique ?", "Une réserve d'eau souterraine.")
+    second = snapshots.save(store.load())
+    store.learn("Qu'est-ce que l'eau grise ?", "L'eau usée des éviers et des douches.")  # journal seulement
+    before = store.load()
+
+    assert rollback(snapshots, 1, store.path, str(tmp_path / "qa_bundle")) == first
+    assert store.load() == BASE
+    assert not os.path.exists(store.journal_path)
+    assert snapshots.manifest()["current"] == first["version"]
+    safety = snapshots.versions()[-1]
+    assert safety["version"] not in (first["version"], second["version"])
+    assert safety["parent"] == second["version"]
+    assert snapshots.load(safety["version"]) == before  # la réponse apprise est gardée
+
+
+def test_rollback_brings_the_bundle_back(store, tmp_path):
+    bundle_dir = str(tmp_path / "qa_bundle")
+    snapshots = SnapshotStore(str(tmp_path / "qa_snapshots"))
+    compile_bundle(BASE, bundle_dir, content_hash(store.path, store.journal_path), base_hash=content_hash(store.path))
+    first = snapshots.save(store.load(), bundle=matching_bundle(store, bundle_dir))
+    assert first["bundle"] is not None
+    store.learn("Qu'est-ce qu'une nappe phréatique ?", "Une réserve d'eau souterraine.")
+    snapshots.save(store.load())
+    os.remove(os.path.join(bundle_dir, first["bundle"]["version"], "keys.json"))
+
+    rollback(snapshots, 1, store.path, bundle_dir)
+    bundle = load_bundle(bundle_dir, embeddings=False)
+    assert bundle is not None and bundle.version == first["bundle"]["version"]
+    assert bundle.manifest["base_hash"] == content_hash(store.path)
+
+
+def test_failed_restore_keeps_the_manifest(store, tmp_path, monkeypatch):
+    bundle_dir = tmp_path / "qa_bundle"
+    bundle_dir.mkdir()  # sans bundle dans l'instantané : recompilation
+    snapshots = SnapshotStore(str(tmp_path / "qa_snapshots"))
+    snapshots.save(store.load())
+    store.learn("Qu'est-ce qu'une nappe phréatique ?", "Une réserve d'eau souterraine.")
+    second = snapshots.save(store.load())
+    store.learn("Qu'est-ce que l'eau grise ?", "L'eau usée des éviers et des douches.")
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("compilation interrompue")
+
+    monkeypatch.setattr(snapshot, "compile_bundle", fail)
+    with pytest.raises(RuntimeError):
+        rollback(snapshots, 1, store.path, str(bundle_dir))
+    assert snapshots.manifest()["current"] == second["version"]
+
+
+def test_corrupt_snapshot_is_not_restored(store, tmp_path):
+    snapshots = SnapshotStore(str(tmp_path / "qa_snapshots"))
+    first = snapshots.save(store.load())
+    store.learn("Qu'est-ce qu'une nappe phréatique ?", "Une réserve d'eau souterraine.")
+    second = snapshots.save(store.load())
+    store.learn("Qu'est-ce que l'eau grise ?", "L'eau usée des éviers et des douches.")
+    before = store.load()
+    with open(os.path.join(snapshots.directory, first["file"]), "r+b") as f:
+        f.seek(-8, os.SEEK_END)
+        f.write(b"\0" * 8)
+
+    with pytest.raises((ValueError, OSError, EOFError)):
+        rollback(snapshots, 1, store.path, str(tmp_path / "qa_bundle"))
+    assert store.load() == before
+    assert snapshots.manifest()["current"] == second["version"]